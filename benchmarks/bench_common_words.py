@@ -0,0 +1,87 @@
+# time of the common word stage of graph_builder at full graph size, against the previous per-line rescans,
+# and of the word index against adding the words of common_words.csv as graph nodes
+# usage: python -m benchmarks.bench_common_words [path/to/kanji_digraph.gexf]
+import csv
+import os
+import random
+import sys
+import tempfile
+import time
+
+from src.data_extraction.graph_builder import add_common_words
+from src.graph_snapshot import load_graph
+from src.word_index import WordIndex
+
+
+def add_common_words_rescan(G, path):
+    # previous implementation, kept as reference
+    with open(path, 'r', encoding='utf-8') as f:
+        for level, line in enumerate(f):
+            for pos, kanji in enumerate([node for node in G.nodes if G.nodes[node]['level'] == 7 - level]):
+                G.nodes[kanji]['common_word'] = line.split(',')[pos].strip()
+    return G
+
+
+def add_words_as_nodes(G, path):
+    # previous work in progress add_words, which added every word as a node
+    with open(path, 'r', encoding='utf-8') as f:
+        for row in csv.reader(f):
+            for word in row[1:]:
+                if word not in G:
+                    G.add_node(word, level=-1, entity='word')
+                for character in word:
+                    G.add_edge(character, word)
+    return G
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else 'data/kanji_digraph.gexf'
+    G = load_graph(path)
+    for _, attrs in G.nodes(data=True):
+        attrs.pop('common_word', None)
+    kanji = [node for node, level in G.nodes(data='level') if level >= 0]
+    random.seed(0)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # one line per level from 7 down to the lowest level, one word per kanji of that level
+        words_txt = os.path.join(tmp, 'common_words.txt')
+        lowest = min(level for _, level in G.nodes(data='level'))
+        with open(words_txt, 'w', encoding='utf-8') as f:
+            for level in range(7, lowest - 1, -1):
+                f.write(','.join(f'{node}い' for node, node_level in G.nodes(data='level') if node_level == level) + '\n')
+        # ten words of two or three kanji per kanji, with some kana
+        words_csv = os.path.join(tmp, 'common_words.csv')
+        with open(words_csv, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.writer(f)
+            for node in kanji:
+                writer.writerow([node] + [node + ''.join(random.sample(kanji, random.randint(1, 2))) + 'する'[:i % 3]
+                                          for i in range(10)])
+
+        rescanned, rescan_time = timed(add_common_words_rescan, G.copy(), words_txt)
+        grouped, grouped_time = timed(add_common_words, G.copy(), words_txt)
+        print(f'{G.number_of_nodes()} nodes')
+        print(f'common words, rescan per line: {rescan_time:8.3f} s')
+        print(f'common words, grouped once:    {grouped_time:8.3f} s')
+        mismatches = sum(rescanned.nodes[node].get('common_word') != grouped.nodes[node].get('common_word')
+                         for node in G)
+        print(f'{mismatches} common words differ')
+
+        with_words, nodes_time = timed(add_words_as_nodes, G.copy(), words_csv)
+        index, index_time = timed(WordIndex.from_csv, list(G.nodes), words_csv)
+        index.save(os.path.join(tmp, 'word_index.npz'))
+        print(f'words as graph nodes:          {nodes_time:8.3f} s, '
+              f'{with_words.number_of_nodes() - G.number_of_nodes()} extra nodes, '
+              f'{with_words.number_of_edges() - G.number_of_edges()} extra edges')
+        print(f'word index:                    {index_time:8.3f} s, {len(index.words)} words, '
+              f'{os.path.getsize(os.path.join(tmp, "word_index.npz")) / 2 ** 20:.2f} MiB on disk')
+        mismatches = sum(set(index.words_with(node)) !=
+                         {word for word in with_words.successors(node) if with_words.nodes[word].get('entity') == 'word'}
+                         for node in kanji)
+        print(f'{mismatches} kanji with different words')
+        sys.exit(1 if mismatches else 0)
@@ -0,0 +1,95 @@
+# size, write and load time of the graph exports: row-by-row CSV and GEXF against the columnar .npz and Parquet files
+# usage: python -m benchmarks.bench_exports [path/to/kanji_digraph.gexf]
+import json
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+from src.data_extraction.graph_builder import write_edges_to_csv, write_nodes_to_csv
+from src.graph_export import HAS_PARQUET, edges_frame, nodes_frame, read_parquet, write_parquet
+from src.graph_snapshot import GraphSnapshot, load_graph, read_gexf, write_gexf, write_npz
+from src.main import ArrayKanjiGraph, KanjiGraph
+from src.similar_index import EXPORT_PREFIX, SimilarKanjiIndex
+
+
+def best_of(function, repeat=3):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def size_mib(*paths):
+    return sum(os.path.getsize(path) for path in paths) / 2 ** 20
+
+
+if __name__ == '__main__':
+    G = load_graph(sys.argv[1] if len(sys.argv) > 1 else 'data/kanji_digraph.gexf')
+    print(f'{G.number_of_nodes()} nodes, {G.number_of_edges()} edges')
+    # shipped in the npz export by graph_builder, so that ArrayKanjiGraph does not rebuild it on load
+    similar_index = SimilarKanjiIndex.from_graph(G).arrays(EXPORT_PREFIX)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_paths = (os.path.join(tmp, 'kanji_nodes.csv'), os.path.join(tmp, 'kanji_edges.csv'))
+        gexf_path = os.path.join(tmp, 'kanji_digraph.gexf')
+        npz_path = os.path.join(tmp, 'kanji_digraph.npz')
+        parquet_paths = (os.path.join(tmp, 'kanji_nodes.parquet'), os.path.join(tmp, 'kanji_edges.parquet'))
+
+        def write_csv():
+            write_nodes_to_csv(G, csv_paths[0])
+            write_edges_to_csv(G, csv_paths[1])
+
+        writers = [('CSV', write_csv, csv_paths), ('GEXF', lambda: write_gexf(G, gexf_path), (gexf_path,)),
+                   ('npz', lambda: write_npz(G, npz_path, similar_index), (npz_path,))]
+        if HAS_PARQUET:
+            # from the npz export, like graph_builder
+            writers.append(('Parquet', lambda: write_parquet(GraphSnapshot(npz_path), tmp), parquet_paths))
+        for name, write, paths in writers:
+            seconds, _ = best_of(write, repeat=1)
+            print(f'write {name:8s} {seconds * 1e3:8.1f} ms, {size_mib(*paths):6.2f} MiB')
+
+        # node and edge tables for analytics
+        def read_npz():
+            snapshot = GraphSnapshot(npz_path)
+            return nodes_frame(snapshot), edges_frame(snapshot)
+
+        def read_csv_lists():
+            nodes = pd.read_csv(csv_paths[0])
+            for column in ('Reading_On', 'Reading_Kun'):
+                nodes[column] = nodes[column].map(json.loads)
+            return nodes, pd.read_csv(csv_paths[1])
+
+        readers = [('CSV', lambda: (pd.read_csv(csv_paths[0]), pd.read_csv(csv_paths[1]))),
+                   ('CSV+json', read_csv_lists), ('npz', read_npz)]
+        if HAS_PARQUET:
+            readers.append(('Parquet', lambda: read_parquet(tmp)))
+        for name, read in readers:
+            seconds, (nodes, edges) = best_of(read)
+            # the CSV header is capitalized for Gephi
+            columns = {column.lower(): column for column in nodes.columns}
+            types = ', '.join(f'{name} {nodes[columns[name]].dtype} ({type(nodes[columns[name]].iloc[-1]).__name__})'
+                              for name in ('level', 'strokes', 'reading_kun'))
+            print(f'tables from {name:8s} {seconds * 1e3:8.1f} ms, {len(nodes)} nodes, {len(edges)} edges: {types}')
+
+        # graph for KanjiGraph
+        for name, load in (('nx.read_gexf', lambda: read_gexf(gexf_path)),
+                           ('KanjiGraph(GEXF)', lambda: KanjiGraph(gexf_path)),
+                           ('KanjiGraph(npz)', lambda: KanjiGraph(npz_path)),
+                           ('ArrayKanjiGraph(npz)', lambda: ArrayKanjiGraph(npz_path))):
+            seconds, _ = best_of(load)
+            print(f'load {name:22s} {seconds * 1e3:8.1f} ms')
+
+        graph = KanjiGraph(npz_path)
+        array_graph = ArrayKanjiGraph(npz_path)
+        mismatches = sum(graph.get_level(node) != G.nodes[node]['level']
+                         or list(graph.get_readings(node)[1]) != G.nodes[node].get('reading_kun', [])
+                         or set(graph.get_components(node)) != set(G.predecessors(node))
+                         or graph.get_readings(node) != array_graph.get_readings(node)
+                         for node in G)
+        print(f'{mismatches} nodes differ between the npz export and the graph')
+        sys.exit(1 if mismatches else 0)
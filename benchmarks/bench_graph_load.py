@@ -0,0 +1,30 @@
+# compare loading the kanji graph from GEXF and from the compact snapshot
+# usage: python -m benchmarks.bench_graph_load [path/to/kanji_digraph.gexf]
+import sys
+import time
+
+import networkx as nx
+
+from src.graph_snapshot import GraphSnapshot, snapshot_path, write_snapshot
+
+
+def best_of(func, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+if __name__ == '__main__':
+    gexf_path = sys.argv[1] if len(sys.argv) > 1 else 'data/kanji_digraph.gexf'
+    path = snapshot_path(gexf_path)
+    if not path.exists():
+        write_snapshot(nx.read_gexf(gexf_path), path)
+
+    G = nx.read_gexf(gexf_path)
+    print(f'{G.number_of_nodes()} nodes, {G.number_of_edges()} edges')
+    print(f'nx.read_gexf:            {best_of(lambda: nx.read_gexf(gexf_path)) * 1000:8.1f} ms')
+    print(f'GraphSnapshot (mmap):    {best_of(lambda: GraphSnapshot(path)) * 1000:8.1f} ms')
+    print(f'GraphSnapshot -> nx:     {best_of(lambda: GraphSnapshot(path).to_networkx()) * 1000:8.1f} ms')
@@ -0,0 +1,45 @@
+# import time of worksheet_creator, i.e. the startup cost before main() runs
+# usage: python -m benchmarks.bench_import_time [--module MODULE] [--budget-ms 200] [--repeat 5]
+# prints a JSON summary and exits with status 1 if the budget is exceeded, so CI can track it
+import argparse
+import json
+import subprocess
+import sys
+
+
+def import_times(module):
+    """
+    Cumulative import time in microseconds per module from python -X importtime
+    """
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+                             capture_output=True, text=True, check=True)
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # nested imports are indented, the same module is only reported once
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--module', default='src.worksheet_generation.worksheet_creator')
+    parser.add_argument('--budget-ms', type=float, default=200)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    runs = [import_times(args.module) for _ in range(args.repeat)]
+    best = min(runs, key=lambda times: times[args.module])
+    total_ms = best[args.module] / 1000
+    slowest = sorted(((name, us) for name, us in best.items() if name.count('.') == 0 and name != args.module),
+                     key=lambda item: item[1], reverse=True)[:10]
+    print(json.dumps({
+        'module': args.module,
+        'import_ms': round(total_ms, 1),
+        'budget_ms': args.budget_ms,
+        'heaviest_top_level_imports_ms': {name: round(us / 1000, 1) for name, us in slowest},
+        'loaded': {name: name in best for name in ('networkx', 'numpy', 'scipy', 'openai', 'sudachipy', 'matplotlib')},
+    }, indent=2))
+    sys.exit(0 if total_ms <= args.budget_ms else 1)
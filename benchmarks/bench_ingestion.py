@@ -0,0 +1,74 @@
+# items/second and peak RSS of graph ingestion: serial five-parse path vs. single-parse process pool
+# usage: python -m benchmarks.bench_ingestion [data directory]
+import argparse
+import json
+import resource
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+from src.data_extraction import graph_builder
+
+
+def serial(filenames):
+    # previous pipeline: concatenate all files, parse every item five times
+    kanji_data = []
+    for filename in filenames:
+        with open(filename, 'r', encoding='utf-8') as f:
+            kanji_data.extend(json.load(f))
+    G = graph_builder.nx.DiGraph()
+    for item in kanji_data:
+        kun_stem, okurigana = graph_builder.split_kun_readings(graph_builder.extract_readings(item['content1'], '訓'))
+        graph_builder.add_record(G, graph_builder.KanjiRecord(
+            kanji=graph_builder.extract_property(item['kanji'], r'「(.*?)」'),
+            level=graph_builder.extract_level(item['content1']),
+            reading_on=graph_builder.extract_readings(item['content1'], '音'),
+            reading_kun=graph_builder.extract_readings(item['content1'], '訓'),
+            kun_stem=kun_stem,
+            okurigana=okurigana,
+            strokes=graph_builder.extract_strokes(item['content1']),
+            components=graph_builder.extract_components(item['content2'])))
+    return G, len(kanji_data)
+
+
+def pipeline(filenames):
+    count = 0
+
+    def counted(records):
+        nonlocal count
+        for record in records:
+            count += 1
+            yield record
+
+    return graph_builder.create_graph_from_records(counted(graph_builder.iter_records(filenames))), count
+
+
+def peak_rss_mib():
+    # ru_maxrss is in KiB on Linux; children are the pool workers
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return own / 1024, children / 1024
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare serial and pooled ingestion of the scraped data files')
+    parser.add_argument('data_dir', nargs='?', default='data')
+    # internal: run a single mode, in a separate process
+    parser.add_argument('--mode', choices=['serial', 'pipeline'], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        mode, data_dir = args.mode, Path(args.data_dir)
+        filenames = sorted(data_dir.glob('kanji_data_*.json'), key=lambda path: int(path.stem.split('_')[-1]))
+        start = time.perf_counter()
+        G, items = (serial if mode == 'serial' else pipeline)(filenames)
+        seconds = time.perf_counter() - start
+        own, children = peak_rss_mib()
+        print(f'{mode:8s} {items} items in {seconds:6.1f} s, {items / seconds:7.1f} items/s, '
+              f'peak RSS {own:6.1f} MiB (largest worker {children:6.1f} MiB), {G.number_of_nodes()} nodes')
+    else:
+        for mode in ('serial', 'pipeline'):
+            # separate processes, so that peak RSS of one mode does not hide the other
+            subprocess.run([sys.executable, '-m', 'benchmarks.bench_ingestion', '--mode', mode, args.data_dir],
+                           check=True)
@@ -0,0 +1,50 @@
+# time the per-kanji loop of worksheet_creator.get_kanji_data with and without the similar kanji index
+# usage: python -m benchmarks.bench_kanji_data_export [path/to/kanji_digraph.gexf]
+import sys
+import time
+
+from src.main import ArrayKanjiGraph, KanjiGraph
+
+
+def export(graph):
+    kanji_list = []
+    for kanji in graph:
+        level = graph.get_level(kanji)
+        if level >= 0:
+            components, compounds, similar_kanji = graph.get_components_compounds_and_similar_kanji(kanji,
+                                                                                                    level_limit=level)
+            if len(components) > 0:
+                kanji_list.append([kanji, components, compounds, similar_kanji])
+    return kanji_list
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else 'data/kanji_digraph.gexf'
+    results = {}
+    graphs = {}
+    for name, factory in (('KanjiGraph', lambda: KanjiGraph(path)),
+                          ('KanjiGraph with index', lambda: KanjiGraph(path, use_similar_index=True)),
+                          ('ArrayKanjiGraph', lambda: ArrayKanjiGraph(path))):
+        start = time.perf_counter()
+        graph = factory()
+        loaded = time.perf_counter()
+        results[name] = export(graph)
+        graphs[name] = graph
+        done = time.perf_counter()
+        print(f'{name:22s} load + index {loaded - start:6.2f} s, export {done - loaded:6.2f} s')
+
+    expected = {item[0]: item for item in results['KanjiGraph']}
+    expected_top = {kanji: graphs['KanjiGraph'].get_similar_kanji(kanji, graphs['KanjiGraph'].get_level(kanji))
+                    for kanji in expected}
+    failed = False
+    for name, kanji_list in results.items():
+        graph = graphs[name]
+        components = sum(item[1] != expected[item[0]][1] for item in kanji_list)
+        mismatches = sum(item[3] != expected[item[0]][3] for item in kanji_list)
+        # get_similar_kanji answers from the top-k table of the index where one is used
+        top = sum(graph.get_similar_kanji(kanji, graph.get_level(kanji)) != expected_top[kanji] for kanji in expected)
+        print(f'{name:22s} {len(kanji_list)} kanji, {mismatches} similar kanji lists, {components} component lists '
+              f'and {top} get_similar_kanji results differ from KanjiGraph')
+        failed = failed or mismatches > 0 or components > 0 or top > 0 or len(kanji_list) != len(expected)
+    if failed:
+        sys.exit(1)
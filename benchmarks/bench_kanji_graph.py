@@ -0,0 +1,44 @@
+# compare memory and query latency of the networkx and the array backed KanjiGraph
+# usage: python -m benchmarks.bench_kanji_graph [path/to/kanji_digraph.gexf]
+import gc
+import sys
+import time
+import tracemalloc
+
+from src.main import ArrayKanjiGraph, KanjiGraph
+
+
+def measure_memory(factory):
+    gc.collect()
+    tracemalloc.start()
+    graph = factory()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return graph, current
+
+
+def measure_queries(graph, kanjis):
+    timings = {}
+    start = time.perf_counter()
+    for kanji in kanjis:
+        graph.get_similar_kanji(kanji, level_limit=graph.get_level(kanji))
+    timings['get_similar_kanji'] = time.perf_counter() - start
+    start = time.perf_counter()
+    for kanji in kanjis:
+        graph.get_components_compounds_and_similar_kanji(kanji, level_limit=graph.get_level(kanji))
+    timings['get_components_compounds_and_similar_kanji'] = time.perf_counter() - start
+    start = time.perf_counter()
+    for kanji in kanjis:
+        graph.get_readings(kanji)
+    timings['get_readings'] = time.perf_counter() - start
+    return timings
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else 'data/kanji_digraph.gexf'
+    for name, factory in (('KanjiGraph', lambda: KanjiGraph(path)), ('ArrayKanjiGraph', lambda: ArrayKanjiGraph(path))):
+        graph, memory = measure_memory(factory)
+        kanjis = [kanji for kanji in graph if graph.get_level(kanji) >= 0]
+        print(f'{name}: {memory / 2 ** 20:.1f} MiB python heap (memory-mapped arrays not included)')
+        for query, seconds in measure_queries(graph, kanjis).items():
+            print(f'  {query:45s} {seconds / len(kanjis) * 1e6:8.2f} us/kanji')
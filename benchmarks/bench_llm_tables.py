@@ -0,0 +1,52 @@
+# end-to-end latency of the table requests for 200 kanji against a local fake OpenAI server
+# usage: python -m benchmarks.bench_llm_tables [number of kanji]
+import os
+import sys
+import tempfile
+import time
+
+from src.worksheet_generation import worksheet_creator
+from src.worksheet_generation.llm import FakeOpenAIServer
+
+
+def kanji_lists(count):
+    kanjis = [chr(0x4e00 + i) for i in range(count)]
+    expl = ''.join(f'[{kanji}る] {kanji}語 !{chr(ord(kanji) + 1)}\n' for kanji in kanjis)
+    vocab = ''.join(f'{kanji}語\n' for kanji in kanjis)
+    return expl, vocab
+
+
+def table_rows(response, pipes):
+    # same filter as worksheet_creator.main, minus header and separator
+    return [line for line in response.split('\n')
+            if line.count('|') == pipes and not line.startswith('|-') and '日本語' not in line]
+
+
+def run(name, func, server):
+    # fresh cache for every run, so that all requests go to the server
+    with tempfile.TemporaryDirectory() as directory:
+        worksheet_creator.context.configure({'llm': {
+            'backend': 'openai', 'base_url': server.base_url, 'cache': os.path.join(directory, 'cache.sqlite'),
+            'concurrency': 8, 'retries': 3, 'backoff': 0.1}})
+        for attribute in ('client', 'async_client', 'response_cache'):
+            worksheet_creator.context.__dict__.pop(attribute, None)
+        requests = server.requests
+        start = time.perf_counter()
+        expl, vocab = func()
+        seconds = time.perf_counter() - start
+        worksheet_creator.context.response_cache.close()
+    print(f'{name:32s} {seconds:6.2f} s, {server.requests - requests:3d} requests, '
+          f'{len(table_rows(expl, 6))} explanation rows, {len(table_rows(vocab, 4))} vocab rows')
+
+
+if __name__ == '__main__':
+    os.environ.setdefault('OPENAI_API_KEY', 'fake')
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    expl, vocab = kanji_lists(count)
+    print(f'{count} kanji')
+    with FakeOpenAIServer(tokens_per_row=worksheet_creator.VOCAB_ROW_TOKENS) as server:
+        run('sequential single requests', lambda: (worksheet_creator.request_table_explanations(expl),
+                                                   worksheet_creator.request_table_vocabs(vocab)), server)
+        run('concurrent batches', lambda: worksheet_creator.request_tables(expl, vocab), server)
+    with FakeOpenAIServer(tokens_per_row=worksheet_creator.VOCAB_ROW_TOKENS, failure_rate=5) as server:
+        run('concurrent batches, 20% 429s', lambda: worksheet_creator.request_tables(expl, vocab), server)
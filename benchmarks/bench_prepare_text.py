@@ -0,0 +1,80 @@
+# time and peak memory of the worksheet text preparation on a ~1MB input, compared to the previous quadratic loop
+# usage: python -m benchmarks.bench_prepare_text [path/to/kanji_digraph.gexf] [input text]
+import io
+import random
+import sys
+import time
+import tracemalloc
+
+from src.main import KanjiGraph
+from src.worksheet_generation.worksheet_creator import iter_morphemes, iter_text_chunks, prepare_kanji_lists
+from sudachipy import Dictionary
+
+
+def prepare_kanji_lists_quadratic(text, morphemes, graph, level):
+    # previous implementation from worksheet_creator.main, kept as reference
+    kanji_list_expl = ""
+    kanji_list_vocab = ""
+    for kanji in text:
+        if 0 <= graph.get_level(kanji) <= level and kanji not in kanji_list_vocab:
+            for morpheme in morphemes:
+                if kanji in morpheme.surface():
+                    kanji_list_vocab += f'{morpheme.surface()}\n'
+                    break
+            _, reading_kun = graph.get_readings(kanji)
+            if reading_kun:
+                kanji_list_expl += "["
+                try:
+                    for i in range(len(reading_kun)):
+                        kanji_list_expl += kanji + reading_kun[i].split('（')[1].split('）')[0] + (
+                            ' ' if i < len(reading_kun) - 1 else ']')
+                except IndexError:
+                    kanji_list_expl += kanji + ']'
+            kanji_list_expl += f' {graph.get_common_word(kanji)}'
+            similar_kanji = graph.get_similar_kanji(kanji, level_limit=level)
+            kanji_list_expl += f'{" !".join(similar_kanji)}\n'
+    return kanji_list_expl, kanji_list_vocab
+
+
+def synthetic_text(graph, size=1_000_000):
+    # sentences of graph kanji mixed with kana, one paragraph per line
+    random.seed(0)
+    kanjis = [kanji for kanji in graph if graph.get_level(kanji) >= 0]
+    kana = 'のはをにがとでもたしてるいう'
+    lines = []
+    length = 0
+    while length < size:
+        line = ''.join(random.choice(kanjis) + random.choice(kana) for _ in range(random.randint(20, 60))) + '。\n'
+        lines.append(line)
+        length += len(line.encode('utf-8'))
+    return ''.join(lines)
+
+
+def measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func()
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, seconds, peak / 2 ** 20
+
+
+if __name__ == '__main__':
+    graph = KanjiGraph(sys.argv[1] if len(sys.argv) > 1 else 'data/kanji_digraph.gexf')
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], 'r', encoding='utf-8') as f:
+            text = f.read()
+    else:
+        text = synthetic_text(graph)
+    tokenizer = Dictionary().create()
+    level = 10
+    print(f'input: {len(text.encode("utf-8")) / 2 ** 20:.2f} MiB, {len(text)} characters')
+
+    new, seconds, peak = measure(lambda: prepare_kanji_lists(
+        iter_morphemes(iter_text_chunks(io.StringIO(text)), tokenizer), graph, level))
+    print(f'single pass, streamed: {seconds:7.2f} s, peak {peak:7.1f} MiB')
+    old, seconds, peak = measure(lambda: prepare_kanji_lists_quadratic(
+        text, list(iter_morphemes(iter_text_chunks(io.StringIO(text)), tokenizer)), graph, level))
+    print(f'quadratic:             {seconds:7.2f} s, peak {peak:7.1f} MiB')
+    print('outputs identical' if new == old else 'OUTPUTS DIFFER')
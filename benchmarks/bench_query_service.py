@@ -0,0 +1,88 @@
+# latency and throughput of the query service against reloading the graph per lookup, with and without batching,
+# cold and warm cache. The service runs in its own process on a Unix socket.
+# usage: python -m benchmarks.bench_query_service [path/to/kanji_digraph.gexf] [clients] [queries per client]
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from src.main import KanjiGraph
+from src.query_service import QueryClient
+
+BATCH_SIZE = 100
+
+
+def make_queries(kanji, count, seed=0):
+    _random = random.Random(seed)
+    queries = []
+    for _ in range(count):
+        method = _random.choice(['components', 'compounds', 'readings', 'level', 'similar_kanji',
+                                 'similar_kanji_deep', 'components_compounds_and_similar_kanji'])
+        params = {'kanji': _random.choice(kanji)}
+        if method.startswith(('similar', 'components_compounds')):
+            params['level_limit'] = _random.randint(0, 7)
+        queries.append({'method': method, 'params': params})
+    return queries
+
+
+def percentiles(latencies):
+    latencies = sorted(latencies)
+    return '  '.join(f'p{p} {latencies[min(len(latencies) - 1, len(latencies) * p // 100)] * 1e3:7.3f} ms'
+                     for p in (50, 95, 99))
+
+
+async def run_clients(socket_path, client_queries, batch_size):
+    latencies = []
+
+    async def client(queries):
+        async with QueryClient(unix_path=socket_path) as connection:
+            for start in range(0, len(queries), batch_size):
+                began = time.perf_counter()
+                if batch_size == 1:
+                    await connection.request('POST', '/query', queries[start])
+                else:
+                    await connection.batch(queries[start:start + batch_size])
+                latencies.append(time.perf_counter() - began)
+
+    began = time.perf_counter()
+    await asyncio.gather(*(client(queries) for queries in client_queries))
+    return time.perf_counter() - began, latencies
+
+
+async def fetch_stats(socket_path):
+    async with QueryClient(unix_path=socket_path) as connection:
+        return await connection.stats()
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else 'data/kanji_digraph.gexf'
+    clients = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+    per_client = int(sys.argv[3]) if len(sys.argv) > 3 else 2000
+
+    start = time.perf_counter()
+    graph = KanjiGraph(path)
+    print(f'one-shot script, graph load per lookup: {(time.perf_counter() - start) * 1e3:8.1f} ms')
+    kanji = [node for node in graph if graph.get_level(node) >= 0]
+    client_queries = [make_queries(kanji, per_client, seed) for seed in range(clients)]
+    total = clients * per_client
+
+    with tempfile.TemporaryDirectory() as tmp:
+        socket_path = os.path.join(tmp, 'kanji.sock')
+        server = subprocess.Popen([sys.executable, '-m', 'src.query_service', '--graph', path, '--unix', socket_path],
+                                  stdout=subprocess.DEVNULL)
+        try:
+            while not os.path.exists(socket_path):
+                if server.poll() is not None:
+                    sys.exit('query service exited')
+                time.sleep(0.05)
+            for label, batch_size in (('single, cold cache', 1), ('single, warm cache', 1),
+                                      (f'batch of {BATCH_SIZE}', BATCH_SIZE)):
+                elapsed, latencies = asyncio.run(run_clients(socket_path, client_queries, batch_size))
+                print(f'{label:20s} {total / elapsed:9.0f} queries/s  per request: {percentiles(latencies)}')
+            print(asyncio.run(fetch_stats(socket_path)))
+        finally:
+            server.terminate()
+            server.wait()
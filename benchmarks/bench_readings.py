@@ -0,0 +1,61 @@
+# correctness of the pre-parsed readings over the full graph, and get_readings against the previous string parsing
+# usage: python -m benchmarks.bench_readings [path/to/kanji_digraph.gexf]
+import sys
+import time
+
+from src.graph_snapshot import split_kun_readings
+from src.main import ArrayKanjiGraph, KanjiGraph
+
+
+def parse_readings_legacy(reading_on: str, reading_kun: str):
+    # previous KanjiGraph.get_readings, which parsed str(list) on every call
+    reading_on = reading_on[1:-1].replace("'", "").split(', ') if len(reading_on) > 2 else []
+    reading_kun = reading_kun[1:-1].replace("'", "").split(', ') if len(reading_kun) > 2 else []
+    return reading_on, reading_kun
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else 'data/kanji_digraph.gexf'
+    graph = KanjiGraph(path)
+    array_graph = ArrayKanjiGraph(path)
+    kanjis = [kanji for kanji in graph if 'reading_on' in graph.G.nodes[kanji]]
+
+    errors = 0
+    legacy_mismatches = 0
+    for kanji in kanjis:
+        attrs = graph.G.nodes[kanji]
+        reading_on, reading_kun = graph.get_readings(kanji)
+        if (reading_on, reading_kun) != array_graph.get_readings(kanji) or \
+                graph.get_kun_stems(kanji) != array_graph.get_kun_stems(kanji) or \
+                graph.get_okurigana(kanji) != array_graph.get_okurigana(kanji):
+            print(f'{kanji}: backends disagree')
+            errors += 1
+        if not all(isinstance(reading, str) for reading in reading_on + reading_kun):
+            print(f'{kanji}: readings are not a list of strings: {attrs["reading_on"]!r}, {attrs["reading_kun"]!r}')
+            errors += 1
+        kun_stems, okurigana = split_kun_readings(reading_kun)
+        if graph.get_kun_stems(kanji) != tuple(kun_stems) or graph.get_okurigana(kanji) != tuple(okurigana):
+            print(f'{kanji}: stems {graph.get_kun_stems(kanji)} and okurigana {graph.get_okurigana(kanji)} '
+                  f'do not match {reading_kun}')
+            errors += 1
+        legacy = parse_readings_legacy(str(list(reading_on)), str(list(reading_kun)))
+        legacy_mismatches += legacy != (list(reading_on), list(reading_kun))
+    print(f'{len(kanjis)} kanji checked, {errors} errors, '
+          f'{legacy_mismatches} readings the previous string parsing got wrong')
+
+    for name, get_readings in (
+            ('string parsing', lambda kanji: parse_readings_legacy(str(list(graph.G.nodes[kanji]['reading_on'])),
+                                                                   str(list(graph.G.nodes[kanji]['reading_kun'])))),
+            ('KanjiGraph', graph.get_readings),
+            ('ArrayKanjiGraph', array_graph.get_readings)):
+        stored = {kanji: (str(list(graph.G.nodes[kanji]['reading_on'])), str(list(graph.G.nodes[kanji]['reading_kun'])))
+                  for kanji in kanjis}
+        if name == 'string parsing':
+            # only time the parsing, not building the strings
+            get_readings = lambda kanji: parse_readings_legacy(*stored[kanji])  # noqa: E731
+        start = time.perf_counter()
+        for _ in range(10):
+            for kanji in kanjis:
+                get_readings(kanji)
+        print(f'{name:16s} {(time.perf_counter() - start) / (10 * len(kanjis)) * 1e9:8.0f} ns/call')
+    sys.exit(1 if errors else 0)
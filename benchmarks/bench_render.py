@@ -0,0 +1,59 @@
+# per-kanji time of rendering similar kanji graphs: spring layout per graph with nx.draw (previous query_graph
+# __main__) against slicing the cached global layout with the headless Renderer
+# usage: python -m benchmarks.bench_render [path/to/kanji_digraph.gexf] [kanji count] [format]
+import os
+import random
+import sys
+import tempfile
+import time
+
+import matplotlib
+matplotlib.use('Agg')
+import networkx as nx  # noqa: E402
+from matplotlib import pyplot as plt  # noqa: E402
+
+from kanji_graph.query_graph import get_similar_kanji, get_similar_kanji_graph  # noqa: E402
+from kanji_graph.render import Renderer, compute_layout, load_layout  # noqa: E402
+from src.graph_snapshot import load_graph  # noqa: E402
+
+
+def render_spring(kanji, G, path):
+    SG = get_similar_kanji_graph(kanji, G)
+    figure = plt.figure(figsize=(6, 6))
+    nx.draw(SG, with_labels=True, pos=nx.spring_layout(SG, weight='depth', k=0.5, iterations=50))
+    figure.savefig(path)
+    plt.close(figure)
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else 'data/kanji_digraph.gexf'
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    file_format = sys.argv[3] if len(sys.argv) > 3 else 'svg'
+    G = load_graph(path)
+    kanji = [node for node, level in G.nodes(data='level') if level >= 0]
+    # random kanji plus the compounds with the largest neighborhoods
+    sample = random.Random(0).sample(kanji, count // 2)
+    sample += sorted(kanji, key=lambda node: -sum(G.out_degree(c) for c in G.predecessors(node)))[:count - len(sample)]
+    sizes = [len(get_similar_kanji(node, G)) for node in sample]
+    print(f'{len(sample)} kanji, {sum(sizes) / len(sizes):.0f} similar kanji on average, at most {max(sizes)}')
+
+    start = time.perf_counter()
+    compute_layout(G)
+    print(f'global layout of {G.number_of_nodes()} nodes: {time.perf_counter() - start:.2f} s (once, then cached)')
+
+    with tempfile.TemporaryDirectory() as tmp:
+        start = time.perf_counter()
+        layout = load_layout(G, os.path.join(tmp, 'kanji_digraph.gexf'))
+        renderer = Renderer(G, layout)
+        setup = time.perf_counter() - start
+        for name, render in (('spring layout + nx.draw', lambda node, out: render_spring(node, G, out)),
+                             ('cached layout Renderer', renderer.render)):
+            timings = []
+            for node in sample:
+                start = time.perf_counter()
+                render(node, os.path.join(tmp, f'{node}.{file_format}'))
+                timings.append(time.perf_counter() - start)
+            timings.sort()
+            print(f'{name:24s} {sum(timings) / len(timings) * 1e3:7.1f} ms per kanji, '
+                  f'median {timings[len(timings) // 2] * 1e3:7.1f} ms, max {timings[-1] * 1e3:7.1f} ms')
+        print(f'renderer setup (layout + figure): {setup:.2f} s')
@@ -0,0 +1,72 @@
+# regression check and timing of query_graph.get_similar_kanji against the previous recursive implementation
+# usage: python -m benchmarks.bench_similar_kanji [path/to/kanji_digraph.gexf] [number of kanji]
+import math
+import random
+import sys
+import time
+
+from kanji_graph.query_graph import get_similar_kanji
+from src.graph_snapshot import load_graph
+
+
+def get_similar_kanji_recursive(kanji, G, depth=0, similar_kanji=None, previous_direction=None, depth_limit=0.9):
+    # previous implementation, kept as reference
+    if similar_kanji is None:
+        similar_kanji = []
+    similar_kanji_set = set(similar_kanji)
+
+    if depth > depth_limit:
+        return similar_kanji
+
+    for component in G.predecessors(kanji):
+        if (component, depth) not in similar_kanji_set:
+            if G.nodes[component]['level'] >= 0:
+                similar_kanji.append((component, depth))
+                similar_kanji_set.add((component, depth))
+            commonality_penalty = math.tanh(len(list(G.successors(component))) / 100)
+            if previous_direction != 'successor':
+                get_similar_kanji_recursive(component, G, depth + commonality_penalty, similar_kanji, 'predecessor', depth_limit)
+
+    for compound in G.successors(kanji):
+        if (compound, depth) not in similar_kanji_set:
+            if G.nodes[compound]['level'] >= 0:
+                similar_kanji.append((compound, depth))
+                similar_kanji_set.add((compound, depth))
+            commonality_penalty = math.tanh(len(list(G.successors(kanji))) / 100)
+            if previous_direction != 'predecessor':
+                get_similar_kanji_recursive(compound, G, depth + commonality_penalty, similar_kanji, 'successor', depth_limit)
+
+    if depth == 0:
+        similar_kanji.sort(key=lambda x: x[1])
+
+    return similar_kanji
+
+
+def minimal_depths(similar_kanji):
+    result = {}
+    for kanji, depth in similar_kanji:
+        result[kanji] = min(depth, result.get(kanji, math.inf))
+    return result
+
+
+if __name__ == '__main__':
+    path = sys.argv[1] if len(sys.argv) > 1 else 'data/kanji_digraph.gexf'
+    sample_size = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    G = load_graph(path)
+    random.seed(0)
+    corpus = random.sample([node for node in G if G.nodes[node]['level'] >= 0], sample_size)
+
+    for depth_limit in (0.5, 0.9, 1.5):
+        mismatches = 0
+        old_time = new_time = 0.0
+        for kanji in corpus:
+            start = time.perf_counter()
+            expected = minimal_depths(get_similar_kanji_recursive(kanji, G, depth_limit=depth_limit))
+            old_time += time.perf_counter() - start
+            start = time.perf_counter()
+            actual = dict(get_similar_kanji(kanji, G, depth_limit=depth_limit))
+            new_time += time.perf_counter() - start
+            if actual.keys() != expected.keys() or any(not math.isclose(actual[k], expected[k]) for k in actual):
+                mismatches += 1
+        print(f'depth_limit={depth_limit}: recursive {old_time / len(corpus) * 1000:8.2f} ms/kanji, '
+              f'best-first {new_time / len(corpus) * 1000:8.2f} ms/kanji, {mismatches} mismatches')
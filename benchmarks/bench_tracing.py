@@ -0,0 +1,48 @@
+# cost of the tracing hooks: per call while disabled, and on the text preparation with tracing off and on
+# usage: python -m benchmarks.bench_tracing [path/to/kanji_digraph.gexf]
+import sys
+import time
+import timeit
+
+from benchmarks import synthetic
+from src.main import KanjiGraph
+from src.tracing import tracer
+from src.worksheet_generation.worksheet_creator import iter_morphemes, iter_text_chunks, prepare_kanji_lists
+from sudachipy import Dictionary
+
+
+def disabled_span():
+    with tracer.span('x'):
+        pass
+
+
+def prepare(text, tokenizer, graph):
+    return prepare_kanji_lists(iter_morphemes(iter_text_chunks(text.splitlines(keepends=True)), tokenizer), graph, 10)
+
+
+def best_of(function, repeat=5):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+if __name__ == '__main__':
+    graph = KanjiGraph(sys.argv[1] if len(sys.argv) > 1 else 'data/kanji_digraph.gexf')
+    tokenizer = Dictionary().create()
+    text = synthetic.make_text(graph.G, 200_000)
+
+    number = 1_000_000
+    print(f'disabled span:  {timeit.timeit(disabled_span, number=number) / number * 1e9:6.0f} ns')
+    print(f'disabled count: {timeit.timeit(lambda: tracer.count("x"), number=number) / number * 1e9:6.0f} ns')
+    print(f'empty function: {timeit.timeit(lambda: None, number=number) / number * 1e9:6.0f} ns')
+
+    disabled = best_of(lambda: prepare(text, tokenizer, graph))
+    tracer.configure({'enabled': True})
+    enabled = best_of(lambda: prepare(text, tokenizer, graph))
+    print(f'text preparation, {len(text)} characters: tracing off {disabled:.3f} s, on {enabled:.3f} s '
+          f'({(enabled / disabled - 1) * 100:+.1f} %)')
+    print('spans and counters of the 5 runs with tracing:')
+    print(tracer.summary())
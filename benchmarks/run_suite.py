@@ -0,0 +1,214 @@
+# benchmark suite over a deterministic synthetic graph: graph load, similarity queries, kanji data export,
+# ingestion and worksheet text preparation (with stub LLM and pandoc). Results are written as JSON and can be
+# compared with an earlier run to catch regressions.
+# usage: python -m benchmarks.run_suite [--kanji 12000] [--output benchmarks/results/latest.json]
+#                                       [--compare benchmarks/results/baseline.json] [--only similar]
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+import networkx as nx
+
+from benchmarks import synthetic
+from kanji_graph import query_graph
+from src.data_extraction import graph_builder
+from src.graph_snapshot import load_graph, read_gexf
+from src.main import ArrayKanjiGraph, KanjiGraph
+
+SAMPLE_SIZE = 200
+
+
+def measure(function, repeat, items=None) -> dict:
+    """
+    Best and mean wall time of repeat calls, and the time per item if the call processes items
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    result = {'best': min(timings), 'mean': statistics.mean(timings), 'repeat': repeat}
+    if items:
+        result['items'] = items
+        result['best_per_item'] = result['best'] / items
+    return result
+
+
+@contextmanager
+def stubbed_worksheet_creator(directory: Path, graph):
+    """
+    worksheet_creator with the given graph, the stub LLM backend, a fresh response cache and a pandoc stand-in
+    that only touches the PDF, writing everything into directory. The logged kanji lists and responses are muted.
+    """
+    from src.worksheet_generation import worksheet_creator as wc
+    patched = {name: getattr(wc, name) for name in ('OUTPUT_DIR', 'TEMPLATE_PATH', 'COMPILE_MANIFEST', 'run_pandoc')}
+    saved_context = dict(wc.context.__dict__)
+
+    def run_pandoc(markdown_file):
+        pdf_file = markdown_file.with_suffix('.pdf')
+        pdf_file.touch()
+        return pdf_file
+
+    (directory / 'template.tex').write_text('template')
+    wc.OUTPUT_DIR = directory
+    wc.TEMPLATE_PATH = directory / 'template.tex'
+    wc.COMPILE_MANIFEST = directory / 'compiled.json'
+    wc.run_pandoc = run_pandoc
+    wc.context.__dict__['graph'] = graph
+    logging.disable(logging.INFO)
+    try:
+        yield wc
+    finally:
+        logging.disable(logging.NOTSET)
+        for name, value in patched.items():
+            setattr(wc, name, value)
+        wc.context.__dict__.clear()
+        wc.context.__dict__.update(saved_context)
+
+
+def run(args) -> dict:
+    results = {}
+
+    def case(name, function, repeat=args.repeat, items=None):
+        if args.only and not any(part in name for part in args.only):
+            return
+        results[name] = measure(function, repeat, items)
+        timing = results[name]
+        per_item = f', {timing["best_per_item"] * 1e3:8.3f} ms per item' if items else ''
+        print(f'{name:62s} best {timing["best"]:8.3f} s, mean {timing["mean"]:8.3f} s{per_item}', flush=True)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        start = time.perf_counter()
+        G = synthetic.make_graph(args.kanji, seed=args.seed)
+        path = synthetic.write_graph(G, tmp / 'graph')
+        print(f'synthetic graph: {G.number_of_nodes()} nodes, {G.number_of_edges()} edges, '
+              f'written in {time.perf_counter() - start:.1f} s', flush=True)
+        kanji = sorted(node for node, level in G.nodes(data='level') if level >= 0)
+        sample = random.Random(args.seed).sample(kanji, min(SAMPLE_SIZE, len(kanji)))
+
+        # graph load
+        case('load/nx.read_gexf', lambda: nx.read_gexf(path))
+        case('load/read_gexf', lambda: read_gexf(path))
+        case('load/load_graph (snapshot)', lambda: load_graph(path))
+        case('load/ArrayKanjiGraph', lambda: ArrayKanjiGraph(path))
+
+        # similarity queries
+        graph = KanjiGraph(path)
+        array_graph = ArrayKanjiGraph(path)
+        for depth_limit in (0.5, 0.9, 1.5):
+            case(f'similar/query_graph.get_similar_kanji depth_limit={depth_limit}',
+                 lambda: [query_graph.get_similar_kanji(k, graph.G, depth_limit) for k in sample], items=len(sample))
+        for depth_limit in (1, 2):
+            case(f'similar/KanjiGraph.get_similar_kanji_deep depth_limit={depth_limit}',
+                 lambda: [graph.get_similar_kanji_deep(k, depth_limit=depth_limit) for k in sample],
+                 items=len(sample))
+            case(f'similar/ArrayKanjiGraph.get_similar_kanji_deep depth_limit={depth_limit}',
+                 lambda: [array_graph.get_similar_kanji_deep(k, depth_limit=depth_limit) for k in sample],
+                 items=len(sample))
+        case('similar/KanjiGraph.get_similar_kanji', lambda: [graph.get_similar_kanji(k, 0) for k in kanji],
+             items=len(kanji))
+
+        # full export of kanji, components and similar kanji, which writes kanji_list.csv to the working directory
+        export_dir = tmp / 'export'
+        export_dir.mkdir()
+        with stubbed_worksheet_creator(tmp, graph) as wc:
+            cwd = os.getcwd()
+            os.chdir(export_dir)
+            try:
+                case('export/get_kanji_data', wc.get_kanji_data, items=len(kanji))
+            finally:
+                os.chdir(cwd)
+
+        # ingestion of scraped items, parsed in this process
+        items = synthetic.make_items(G, args.ingest_items)
+        case('ingest/create_graph', lambda: graph_builder.create_graph(items), repeat=1, items=len(items))
+
+        # worksheet creation for a text, LLM and pandoc stubbed
+        text_file = tmp / 'text.txt'
+        text_file.write_text(synthetic.make_text(G, args.text_characters, args.seed), encoding='utf-8')
+        try:
+            import sudachipy  # noqa: F401
+        except ImportError:
+            print('worksheet/*: skipped, sudachipy is not installed')
+        else:
+            with stubbed_worksheet_creator(tmp, graph) as wc:
+                runs = iter(range(args.repeat))
+
+                def create_worksheet():
+                    # a fresh response cache for every run, so that the stub requests are part of the timing
+                    wc.context.__dict__.pop('response_cache', None)
+                    wc.context.configure({'llm': {'backend': 'stub', 'cache': str(tmp / f'cache-{next(runs)}.sqlite')}})
+                    for markdown_file in wc.create_worksheet(text_file, 10, {}):
+                        wc.compile_worksheet(markdown_file, open_pdf=False)
+
+                wc.context.tokenizer  # load the Sudachi dictionary outside of the timing
+                case('worksheet/create_worksheet', create_worksheet, items=args.text_characters)
+    return results
+
+
+def metadata(args) -> dict:
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ''
+    return {'commit': commit, 'python': platform.python_version(), 'platform': platform.platform(),
+            'networkx': nx.__version__, 'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'kanji': args.kanji, 'seed': args.seed, 'repeat': args.repeat}
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """
+    Print the change of the best time of every case against the baseline, returns the cases slower than threshold
+    """
+    regressions = []
+    for name, timing in results.items():
+        if name not in baseline:
+            continue
+        ratio = timing['best'] / baseline[name]['best']
+        flag = ''
+        if ratio > threshold:
+            regressions.append(name)
+            flag = '  REGRESSION'
+        print(f'{name:62s} {baseline[name]["best"]:8.3f} s -> {timing["best"]:8.3f} s  x{ratio:5.2f}{flag}')
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run the benchmark suite on a synthetic kanji graph')
+    parser.add_argument('--kanji', type=int, default=12000, help='kanji in the synthetic graph')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--ingest-items', type=int, default=1000)
+    parser.add_argument('--text-characters', type=int, default=50_000)
+    parser.add_argument('--only', nargs='*', help='only run cases whose name contains one of these strings')
+    parser.add_argument('--output', default='benchmarks/results/latest.json')
+    parser.add_argument('--compare', help='results JSON of an earlier run')
+    parser.add_argument('--threshold', type=float, default=1.25, help='slowdown that counts as a regression')
+    args = parser.parse_args()
+
+    report = {'meta': metadata(args), 'results': run(args)}
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+    print(f'Results written to {args.output}')
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline['meta'].get('kanji') != args.kanji or baseline['meta'].get('seed') != args.seed:
+            print('Warning: the baseline was run on a different synthetic graph')
+        regressions = compare(report['results'], baseline['results'], args.threshold)
+        if regressions:
+            print(f'{len(regressions)} regressions: {", ".join(regressions)}')
+            sys.exit(1)
@@ -0,0 +1,125 @@
+# deterministic synthetic kanji graph, scraped items and texts for the benchmarks
+# usage: python -m benchmarks.synthetic [output directory] [kanji] [seed]
+# writes kanji_digraph.gexf with snapshot and similar kanji index, which the other benchmarks take as argument
+import bisect
+import random
+import sys
+from pathlib import Path
+from typing import List
+
+import networkx as nx
+
+from src.graph_snapshot import snapshot_path, split_kun_readings, write_gexf, write_snapshot
+from src.similar_index import INDEX_FILENAME, SimilarKanjiIndex
+
+# CJK unified ideographs for kanji, radicals supplement for components that are not kanji themselves
+KANJI_START = 0x4E00
+RADICAL_START = 0x2E80
+# distribution of the number of components per kanji
+COMPONENT_COUNTS = (1, 2, 3, 4)
+COMPONENT_COUNT_WEIGHTS = (0.15, 0.5, 0.27, 0.08)
+# kanji kentei levels 1-10, more kanji in the harder levels
+LEVELS = tuple(range(1, 11))
+LEVEL_WEIGHTS = (30, 25, 12, 9, 8, 6, 5, 3, 1.5, 0.5)
+ON_READINGS = ('ジ', 'シ', 'チ', 'コウ', 'ショウ', 'カ', 'ケン', 'セイ', 'トウ', 'ユウ')
+KUN_READINGS = ('も（つ）', 'とき', 'ひ（く）', 'はな（す）', 'やま', 'み（る）', 'かわ', 'うご（く）')
+
+
+def make_graph(n_kanji=12000, n_radicals=250, seed=0) -> nx.DiGraph:
+    """
+    Kanji digraph with the attributes graph_builder produces. Components are drawn with capped Pareto distributed
+    weights, radicals heavier than kanji, so that a few hubs have several hundred compounds (like 口, 氵 or 木) and
+    most components only one or two, as in the real graph. Kanji become candidate components once created.
+    """
+    rng = random.Random(seed)
+    G = nx.DiGraph()
+    components = []
+    cumulative_weights = []
+
+    def add_candidate(node, weight):
+        components.append(node)
+        cumulative_weights.append((cumulative_weights[-1] if cumulative_weights else 0) + weight)
+
+    for i in range(n_radicals):
+        radical = chr(RADICAL_START + i)
+        G.add_node(radical, level=-1)
+        add_candidate(radical, 20 * min(rng.paretovariate(1.5), 50))
+
+    for i in range(n_kanji):
+        kanji = chr(KANJI_START + i)
+        reading_kun = rng.sample(KUN_READINGS, rng.choice((0, 0, 1, 1, 2)))
+        kun_stem, okurigana = split_kun_readings(reading_kun)
+        G.add_node(kanji, level=rng.choices(LEVELS, LEVEL_WEIGHTS)[0], strokes=rng.randint(1, 25),
+                   reading_on=rng.sample(ON_READINGS, rng.randint(0, 3)), reading_kun=reading_kun,
+                   kun_stem=kun_stem, okurigana=okurigana,
+                   common_word=kanji + rng.choice(('い', 'する', '物', '人')))
+        count = rng.choices(COMPONENT_COUNTS, COMPONENT_COUNT_WEIGHTS)[0]
+        for _ in range(count):
+            position = bisect.bisect(cumulative_weights, rng.random() * cumulative_weights[-1])
+            G.add_edge(components[min(position, len(components) - 1)], kanji)
+        add_candidate(kanji, min(rng.paretovariate(1.2), 20))
+    return G
+
+
+def make_items(G: nx.DiGraph, count=None) -> List[dict]:
+    """
+    Scraped items in the format of data/kanji_data_*.json for the kanji of the graph, in node order
+    """
+    full_width = str.maketrans('0123456789', '０１２３４５６７８９')
+    items = []
+    for kanji, attrs in G.nodes(data=True):
+        if attrs['level'] < 0:
+            continue
+        if count is not None and len(items) == count:
+            break
+        strokes = str(attrs['strokes']).translate(full_width)
+        rows = [f'<tr><th>漢字検定</th><td>{str(attrs["level"]).translate(full_width)}級</td></tr>',
+                f'<tr><th>画数</th><td>{strokes}画（一１＋{strokes}）</td></tr>']
+        for reading_type, readings in (('音読み', attrs['reading_on']), ('訓読み', attrs['reading_kun'])):
+            for i, reading in enumerate(readings):
+                header = f'<th rowspan="{len(readings)}">{reading_type}</th>' if i == 0 else ''
+                rows.append(f'<tr>{header}<td>{reading}</td></tr>')
+        # the scraped pages carry a lot of text around the tables
+        content1 = f'<div><p>{"説明" * 800}</p><table>{"".join(rows)}</table><p>footer</p></div>'
+        content2 = f'<div><ul><li>部首</li><li>{"＋".join(G.predecessors(kanji))}</li></ul><p>{"例" * 600}</p></div>'
+        items.append({'kanji': f'漢字「{kanji}」の読み', 'content1': content1, 'content2': content2})
+    return items
+
+
+def make_text(G: nx.DiGraph, characters=100_000, seed=0) -> str:
+    """
+    Text of words of one to three kanji of the graph with kana in between, more frequent kanji in the easier levels
+    """
+    rng = random.Random(seed)
+    kanji = [node for node, level in G.nodes(data='level') if level >= 0]
+    weights = [G.nodes[node]['level'] for node in kanji]
+    words = []
+    size = 0
+    while size < characters:
+        word = ''.join(rng.choices(kanji, weights, k=rng.randint(1, 3))) + rng.choice(('の', 'を', 'が', 'です。\n'))
+        words.append(word)
+        size += len(word)
+    return ''.join(words)
+
+
+def write_graph(G: nx.DiGraph, directory) -> Path:
+    """
+    Write the graph like graph_builder.write_outputs, returns the path of the GEXF file
+    """
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+    gexf_path = directory / 'kanji_digraph.gexf'
+    write_gexf(G, gexf_path)
+    write_snapshot(G, snapshot_path(gexf_path))
+    SimilarKanjiIndex.from_graph(G).save(snapshot_path(gexf_path) / INDEX_FILENAME)
+    return gexf_path
+
+
+if __name__ == '__main__':
+    directory = sys.argv[1] if len(sys.argv) > 1 else 'benchmarks/data'
+    G = make_graph(int(sys.argv[2]) if len(sys.argv) > 2 else 12000, seed=int(sys.argv[3]) if len(sys.argv) > 3 else 0)
+    path = write_graph(G, directory)
+    fan_out = sorted((degree for _, degree in G.out_degree() if degree > 0), reverse=True)
+    print(f'{path}: {G.number_of_nodes()} nodes, {G.number_of_edges()} edges')
+    print(f'compounds per component: max {fan_out[0]}, top 10 {fan_out[:10]}, '
+          f'median {fan_out[len(fan_out) // 2]}, {len(fan_out)} components')
@@ -1,46 +1,82 @@
+import heapq
+import itertools
 import math
+import weakref
+from typing import Dict, Iterator, List, Tuple
 
 import networkx as nx
-import matplotlib
-from matplotlib import pyplot as plt
-matplotlib.rcParams['font.sans-serif'] = 'Hiragino Sans GB'
-
-
-def get_similar_kanji(kanji, G, depth=0, similar_kanji=None, previous_direction=None, depth_limit=0.9):
-    if similar_kanji is None:
-        similar_kanji = []
-    similar_kanji_set = set(similar_kanji)
-
-    # Add depth limit to prevent infinite recursion
-    if depth > depth_limit:
-        return similar_kanji
-
-    # components of the kanji (predecessors)
-    for component in G.predecessors(kanji):
-        if (component, depth) not in similar_kanji_set:
-            if G.nodes[component]['level'] >= 0:
-                similar_kanji.append((component, depth))
-                similar_kanji_set.add((component, depth))
-            # strokes = G.nodes[component]['strokes'] if 'strokes' in G.nodes[component] else 2
-            commonality_penalty = math.tanh(len(list(G.successors(component))) / 100)
-            if previous_direction != 'successor':
-                get_similar_kanji(component, G, depth + commonality_penalty, similar_kanji, 'predecessor', depth_limit)
-
-    # kanji that contain the kanji as component (successors)
-    for compound in G.successors(kanji):
-        if (compound, depth) not in similar_kanji_set:
-            if G.nodes[compound]['level'] >= 0:
-                similar_kanji.append((compound, depth))
-                similar_kanji_set.add((compound, depth))
-            # strokes = G.nodes[kanji]['strokes'] if 'strokes' in G.nodes[kanji] else 2
-            commonality_penalty = math.tanh(len(list(G.successors(kanji))) / 100)
-            if previous_direction != 'predecessor':
-                get_similar_kanji(compound, G, depth + commonality_penalty, similar_kanji, 'successor', depth_limit)
-
-    if depth == 0:
-        similar_kanji.sort(key=lambda x: x[1])
-
-    return similar_kanji
+
+from src.graph_snapshot import load_graph
+from src.tracing import tracer
+
+
+_penalty_cache = weakref.WeakKeyDictionary()
+
+
+def commonality_penalties(G) -> Dict[str, float]:
+    """
+    Cost of stepping through a node: tanh(number of compounds / 100), so that very common components
+    like 口 or 亻 connect kanji less closely. Computed once per graph.
+    """
+    penalties = _penalty_cache.get(G)
+    if penalties is None or len(penalties) != len(G):
+        penalties = {node: math.tanh(degree / 100) for node, degree in G.out_degree()}
+        _penalty_cache[G] = penalties
+    return penalties
+
+
+def iter_similar_kanji(kanji, G, depth_limit=0.9) -> Iterator[Tuple[str, float]]:
+    """
+    Yield (kanji, depth) pairs in order of increasing depth, each kanji once with its minimal depth.
+
+    Best-first search over (node, direction) states: from the start, the walk either only moves to components
+    (predecessors) or only to compounds (successors). Moving to a component costs that component's penalty,
+    moving to a compound costs the penalty of the current node. Every expanded node lists all of its components
+    and compounds at its own depth.
+    """
+    penalties = commonality_penalties(G)
+    seen = set()
+    best = {(kanji, None): 0.0}
+    heap = [(0.0, 0, kanji, None)]
+    counter = 1  # tie breaker, keeps the heap from comparing directions
+    expanded = 0
+    try:
+        while heap:
+            depth, _, node, direction = heapq.heappop(heap)
+            if depth > depth_limit:
+                break
+            if depth > best[(node, direction)]:
+                continue  # stale entry
+            expanded += 1
+
+            for neighbor in itertools.chain(G.predecessors(node), G.successors(node)):
+                if neighbor not in seen:
+                    seen.add(neighbor)
+                    if G.nodes[neighbor]['level'] >= 0:
+                        yield neighbor, depth
+
+            steps = []
+            if direction != 'successor':
+                steps.extend((component, penalties[component], 'predecessor') for component in G.predecessors(node))
+            if direction != 'predecessor':
+                steps.extend((compound, penalties[node], 'successor') for compound in G.successors(node))
+            for neighbor, penalty, next_direction in steps:
+                next_depth = depth + penalty
+                if next_depth <= depth_limit and next_depth < best.get((neighbor, next_direction), math.inf):
+                    best[(neighbor, next_direction)] = next_depth
+                    heapq.heappush(heap, (next_depth, counter, neighbor, next_direction))
+                    counter += 1
+    finally:
+        tracer.count('query_graph.expanded', expanded)
+        tracer.count('query_graph.visited', len(seen))
+
+
+def get_similar_kanji(kanji, G, depth_limit=0.9, top_k=None) -> List[Tuple[str, float]]:
+    """
+    Kanji connected to the given kanji through shared components, as (kanji, depth) pairs sorted by depth.
+    The result includes the kanji itself if it is reachable. Stops after top_k kanji if given.
+    """
+    return list(itertools.islice(iter_similar_kanji(kanji, G, depth_limit), top_k))
 
 
 def get_similar_kanji_graph(kanji, G):
@@ -53,21 +89,24 @@ def get_similar_kanji_graph(kanji, G):
 
 
 if __name__ == "__main__":
+    # matplotlib is only needed for plotting, keep it out of the import of this module
+    import matplotlib
+    from matplotlib import pyplot as plt
+    matplotlib.rcParams['font.sans-serif'] = 'Hiragino Sans GB'
+
     # load graph
-    G = nx.read_gexf('data/kanji_digraph.gexf')
+    G = load_graph('data/kanji_digraph.gexf')
 
     # Get similar kanji
     kanji = '持'
-    similar_kanji = get_similar_kanji(kanji, G)
-    # filter out kanji with depth > 1
-    similar_kanji = [item for item in similar_kanji if item[1] <= 1]
-    # order by depth
-    similar_kanji = sorted(similar_kanji, key=lambda x: x[1])
-    # remove duplicates and original kanji, preserving order
-    similar_kanji = [item[0] for item in similar_kanji if item[0] != kanji and item[0] not in similar_kanji]
+    # remove original kanji, results are ordered by depth
+    similar_kanji = [item[0] for item in get_similar_kanji(kanji, G) if item[0] != kanji]
 
     SG = get_similar_kanji_graph(kanji, G)
-    # plot graph
-    nx.draw(SG, with_labels=True, pos=nx.spring_layout(SG, weight='depth', k=0.5, iterations=50))
+    # plot graph, positioned from the cached global layout instead of a spring layout per call
+    # (python -m kanji_graph.render writes the graphs of many kanji to files without a display)
+    from kanji_graph.render import load_layout, similar_kanji_positions
+    pos = similar_kanji_positions(kanji, get_similar_kanji(kanji, G), load_layout(G, 'data/kanji_digraph.gexf'))
+    nx.draw(SG, with_labels=True, pos=pos)
     plt.show()
     print(similar_kanji)
\ No newline at end of file
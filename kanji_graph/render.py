@@ -0,0 +1,196 @@
+# headless rendering of similar kanji graphs to SVG/PNG, positioned with a layout computed once for the whole graph
+# usage: python -m kanji_graph.render 持 時 [--all] [--format png] [--out out/graphs] [--processes 4]
+import argparse
+import math
+import os
+import warnings
+from multiprocessing import Pool
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import networkx as nx
+import numpy as np
+from scipy import sparse
+
+from kanji_graph.query_graph import commonality_penalties, get_similar_kanji
+from src.graph_snapshot import load_graph, snapshot_path
+
+LAYOUT_FILENAME = 'layout.npz'
+# Hiragino on macOS, Noto or IPA fonts on Linux
+FONTS = ['Hiragino Sans GB', 'Noto Sans CJK JP', 'IPAexGothic', 'IPAGothic', 'DejaVu Sans']
+
+
+def compute_layout(G: nx.DiGraph, iterations=50, alpha=0.85, seed=0) -> np.ndarray:
+    """
+    2D coordinates in [0, 1] for every node of the graph, in node order.
+    Random start positions are smoothed over the undirected graph (personalized PageRank style diffusion with
+    sparse matrix products), so that kanji sharing components end up close to each other. Edges through common
+    components are weighted down like in query_graph, otherwise the big hubs would pull everything together.
+    Each axis is rank-normalized, which spreads out the dense center evenly.
+    """
+    ids = list(G.nodes)
+    index = {node: i for i, node in enumerate(ids)}
+    n = len(ids)
+    penalties = commonality_penalties(G)
+    edges = np.array([(index[u], index[v]) for u, v in G.edges()], dtype=np.int64).reshape(-1, 2)
+    weights = np.array([max(1 - penalties[u], 0.05) for u, _ in G.edges()])
+    adjacency = sparse.coo_matrix((weights, (edges[:, 0], edges[:, 1])), shape=(n, n)).tocsr()
+    adjacency = adjacency + adjacency.T
+    degree = np.asarray(adjacency.sum(axis=1)).ravel()
+    # row-normalized transition matrix, isolated nodes keep their start position
+    transition = sparse.diags(np.divide(1, degree, out=np.zeros(n), where=degree > 0)) @ adjacency
+    damping = np.where(degree > 0, alpha, 0)[:, None]
+
+    start = np.random.default_rng(seed).uniform(-1, 1, size=(n, 2))
+    coordinates = start
+    for _ in range(iterations):
+        coordinates = (1 - damping) * start + damping * (transition @ coordinates)
+    ranks = np.argsort(np.argsort(coordinates, axis=0, kind='stable'), axis=0, kind='stable')
+    return ranks / max(n - 1, 1)
+
+
+def layout_path(gexf_path) -> Path:
+    return snapshot_path(gexf_path) / LAYOUT_FILENAME
+
+
+def load_layout(G: nx.DiGraph, gexf_path) -> Dict[str, np.ndarray]:
+    """
+    Coordinates by node, from the layout stored next to the graph snapshot. The layout is recomputed
+    and stored if it is missing, older than the GEXF file or was computed for other nodes.
+    """
+    path = layout_path(gexf_path)
+    gexf_path = Path(gexf_path)
+    ids = list(G.nodes)
+    coordinates = None
+    if path.exists() and (not gexf_path.exists() or path.stat().st_mtime >= gexf_path.stat().st_mtime):
+        with np.load(path) as data:
+            if data['ids'].tolist() == ids:
+                coordinates = data['coordinates']
+    if coordinates is None:
+        coordinates = compute_layout(G)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        np.savez(path, ids=np.asarray(ids), coordinates=coordinates)
+    return dict(zip(ids, coordinates))
+
+
+def similar_kanji_positions(kanji: str, similar_kanji: List[Tuple[str, float]],
+                            layout: Dict[str, np.ndarray]) -> Dict[str, Tuple[float, float]]:
+    """
+    Positions of the similar kanji around the kanji. The distance is the depth of the similar kanji, so that closer
+    kanji are drawn closer. The angles keep the order of the directions in the global layout, but are spaced evenly,
+    since kanji that share a component lie close together in the global layout and would overlap.
+    """
+    center = layout[kanji]
+    items = list(dict.fromkeys(item for item, _ in similar_kanji if item != kanji))
+    depths = dict(similar_kanji)
+    offsets = np.array([layout[item] - center for item in items]).reshape(-1, 2)
+    order = np.argsort(np.arctan2(offsets[:, 1], offsets[:, 0]), kind='stable')
+    positions = {kanji: (0.0, 0.0)}
+    angles = dict(zip((items[i] for i in order.tolist()), np.linspace(0, 2 * math.pi, len(items), endpoint=False)))
+    for item in items:
+        radius = 0.15 + depths[item]
+        positions[item] = (radius * math.cos(angles[item]), radius * math.sin(angles[item]))
+    return positions
+
+
+class Renderer:
+    """
+    Draws similar kanji graphs on one reused Agg figure, without pyplot or an interactive backend.
+    Only the max_labels closest similar kanji are labelled, the rest of a hub's neighborhood is drawn as dots.
+    """
+
+    def __init__(self, G: nx.DiGraph, layout: Dict[str, np.ndarray], depth_limit=0.9, size=6, max_labels=80):
+        import matplotlib
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.figure import Figure
+
+        matplotlib.rcParams['font.sans-serif'] = FONTS
+        # keep labels as text in SVG files: much faster than glyph outlines, and the viewer supplies the font
+        matplotlib.rcParams['svg.fonttype'] = 'none'
+        # without a Japanese font, every label would warn about missing glyphs
+        warnings.filterwarnings('ignore', message='Glyph .* missing from font')
+        self.G = G
+        self.layout = layout
+        self.depth_limit = depth_limit
+        self.max_labels = max_labels
+        self.figure = Figure(figsize=(size, size))
+        FigureCanvasAgg(self.figure)
+        self.axes = self.figure.add_axes((0, 0, 1, 1))
+
+    def render(self, kanji: str, path):
+        from matplotlib.collections import LineCollection
+
+        similar_kanji = [item for item in get_similar_kanji(kanji, self.G, self.depth_limit) if item[0] != kanji]
+        positions = similar_kanji_positions(kanji, similar_kanji, self.layout)
+        depths = dict(similar_kanji)
+        nodes = list(positions)
+        points = np.array([positions[node] for node in nodes])
+
+        axes = self.axes
+        axes.clear()
+        axes.set_axis_off()
+        # edge strength like get_similar_kanji_graph: 1 / (depth + 0.1)
+        widths = [min(2.0, 0.2 / (depths[node] + 0.1)) for node in nodes[1:]]
+        axes.add_collection(LineCollection([((0, 0), positions[node]) for node in nodes[1:]],
+                                           linewidths=widths, colors='#999999', zorder=1))
+        # similar kanji are ordered by depth, the labelled ones get larger markers
+        labelled = min(len(nodes) - 1, self.max_labels)
+        axes.scatter(points[:, 0], points[:, 1], s=[600] + [300] * labelled + [40] * (len(nodes) - 1 - labelled),
+                     c=['#f4a261'] + ['#a8dadc'] * (len(nodes) - 1), zorder=2)
+        for node in nodes[:labelled + 1]:
+            x, y = positions[node]
+            axes.text(x, y, node, ha='center', va='center', fontsize=14 if node == kanji else 10, zorder=3)
+        limit = max(1.0, float(np.abs(points).max()) + 0.2)
+        axes.set_xlim(-limit, limit)
+        axes.set_ylim(-limit, limit)
+        axes.set_aspect('equal')
+        self.figure.savefig(path)
+
+
+_renderer = None
+
+
+def _init_worker(gexf_path, depth_limit):
+    global _renderer
+    G = load_graph(gexf_path)
+    _renderer = Renderer(G, load_layout(G, gexf_path), depth_limit)
+
+
+def _render_to(args):
+    kanji, path = args
+    _renderer.render(kanji, path)
+    return path
+
+
+def render_batch(kanjis: List[str], gexf_path, out_dir, file_format='svg', depth_limit=0.9, processes=1) -> List[Path]:
+    """
+    Render the similar kanji graph of every kanji to out_dir/<kanji>.<file_format>
+    """
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    jobs = [(kanji, out_dir / f'{kanji}.{file_format}') for kanji in kanjis]
+    if processes == 1:
+        _init_worker(gexf_path, depth_limit)
+        return [_render_to(job) for job in jobs]
+    # compute and store the layout once, so that the workers only load it
+    load_layout(load_graph(gexf_path), gexf_path)
+    with Pool(processes, initializer=_init_worker, initargs=(gexf_path, depth_limit)) as pool:
+        return pool.map(_render_to, jobs, chunksize=max(1, min(16, len(jobs) // (4 * processes))))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Render similar kanji graphs to SVG or PNG files')
+    parser.add_argument('kanji', nargs='*')
+    parser.add_argument('--all', action='store_true', help='render every kanji of the graph')
+    parser.add_argument('--graph', default='data/kanji_digraph.gexf')
+    parser.add_argument('--format', default='svg', choices=['svg', 'png', 'pdf'])
+    parser.add_argument('--out', default='out/graphs')
+    parser.add_argument('--depth-limit', type=float, default=0.9)
+    parser.add_argument('--processes', type=int, default=os.cpu_count())
+    args = parser.parse_args()
+
+    kanjis = args.kanji
+    if args.all:
+        kanjis = [node for node, level in load_graph(args.graph).nodes(data='level') if level >= 0]
+    paths = render_batch(kanjis, args.graph, args.out, args.format, args.depth_limit, args.processes)
+    print(f'Rendered {len(paths)} graphs to {args.out}')
@@ -1 +1,8 @@
-from src import main
+import importlib
+
+
+def __getattr__(name):
+    # import src.main (and with it networkx, numpy and scipy) only when it is used
+    if name == 'main':
+        return importlib.import_module('src.main')
+    raise AttributeError(f"module 'src' has no attribute {name!r}")
@@ -1,11 +1,57 @@
 # create graph from the data scraped from the web
+import argparse
 import csv
+import hashlib
 import json
+import os
 import re
+import time
 import unicodedata
+from collections import defaultdict
+from multiprocessing import Pool
+from typing import Iterable, Iterator, List, NamedTuple, Tuple
 
 import networkx as nx
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+from src.graph_export import EDGES_PARQUET, HAS_PARQUET, NODES_PARQUET, write_parquet
+from src.graph_snapshot import GraphSnapshot, snapshot_path, split_kun_readings, write_gexf, write_npz, write_snapshot
+from src.similar_index import EXPORT_PREFIX, INDEX_FILENAME, SimilarKanjiIndex
+from src.word_index import WORD_INDEX_FILENAME, WORDS_CSV_PATH, WordIndex
+
+DATA_FILES = [f'data/kanji_data_{i}.json' for i in range(100, 11800, 100)]
+GEXF_PATH = 'data/kanji_digraph.gexf'
+NPZ_PATH = 'data/kanji_digraph.npz'
+MANIFEST_PATH = 'data/build_manifest.json'
+COMMON_WORDS_PATH = 'data/common_words.txt'
+# inputs besides the data files, a change of any of them rebuilds the outputs
+INPUT_FILES = [COMMON_WORDS_PATH, WORDS_CSV_PATH]
+# bump when the records change, so that incremental builds reparse all files
+PARSER_VERSION = 3
+
+
+class KanjiRecord(NamedTuple):
+    kanji: str
+    level: int
+    reading_on: List[str]
+    reading_kun: List[str]
+    kun_stem: List[str]
+    okurigana: List[str]
+    strokes: int
+    components: List[str]
+
+
+def make_soup(html, parse_only=None):
+    # the extract_* functions accept raw html or an already parsed soup
+    if isinstance(html, BeautifulSoup):
+        return html
+    return BeautifulSoup(html, HTML_PARSER, parse_only=parse_only)
 
 
 def extract_property(html, pattern):
@@ -14,7 +60,7 @@ def extract_property(html, pattern):
 
 
 def extract_level(html):
-    soup = BeautifulSoup(html, 'html.parser')
+    soup = make_soup(html)
     result = -1
     for tr in soup.find_all('tr'):
         if '級' in tr.get_text() and tr.find('th') is not None and tr.find('th').get_text() == '漢字検定':
@@ -27,7 +73,7 @@ def extract_level(html):
 
 
 def extract_readings(html, reading_type):
-    soup = BeautifulSoup(html, 'html.parser')
+    soup = make_soup(html)
     readings = []
     for th in soup.find_all('th'):
         if reading_type in th.get_text():
@@ -41,11 +87,11 @@ def extract_readings(html, reading_type):
                 current_tr = current_tr.find_next_sibling('tr')
             break
 
-    return str(readings)
+    return readings
 
 
 def extract_components(html):
-    soup = BeautifulSoup(html, 'html.parser')
+    soup = make_soup(html)
     try:
         return soup.find_all('li')[1].get_text().split('＋')
     except IndexError:
@@ -53,7 +99,7 @@ def extract_components(html):
 
 
 def extract_strokes(html):
-    soup = BeautifulSoup(html, 'html.parser')
+    soup = make_soup(html)
     for tr in soup.find_all('tr'):
         if '画数' in tr.get_text() and tr.find('th') is not None and tr.find('th').get_text() == '画数':
             text = tr.get_text(strip=True)
@@ -66,58 +112,155 @@ def extract_strokes(html):
     return int(result)
 
 
-def create_graph(data):
-    G = nx.DiGraph()
-    for item in data:
-        kanji = extract_property(item['kanji'], r'「(.*?)」')
-        level = extract_level(item['content1'])
-        reading_on = extract_readings(item['content1'], '音')
-        reading_kun = extract_readings(item['content1'], '訓')
-        strokes = extract_strokes(item['content1'])
-        if kanji not in G:
-            G.add_node(kanji, level=level, reading_on=reading_on, reading_kun=reading_kun, strokes=strokes)
-        else:
-            G.nodes[kanji]['level'] = level
-            if reading_on:
-                G.nodes[kanji]['reading_on'] = reading_on
-            if reading_kun:
-                G.nodes[kanji]['reading_kun'] = reading_kun
-            G.nodes[kanji]['strokes'] = strokes
-        for component in extract_components(item['content2']):
-            if component not in G:
-                G.add_node(component, level=-1)  # mark as non-existent kanji
-            G.add_edge(component, kanji)  # relationship is component -> kanji
+def parse_item(item) -> KanjiRecord:
+    """
+    Parse the html of a scraped item once and extract everything the graph needs
+    """
+    # only table rows and list items are used, skip building the rest of the tree
+    content1 = make_soup(item['content1'], SoupStrainer('tr'))
+    content2 = make_soup(item['content2'], SoupStrainer('li'))
+    reading_kun = extract_readings(content1, '訓')
+    kun_stem, okurigana = split_kun_readings(reading_kun)
+    return KanjiRecord(kanji=extract_property(item['kanji'], r'「(.*?)」'),
+                       level=extract_level(content1),
+                       reading_on=extract_readings(content1, '音'),
+                       reading_kun=reading_kun,
+                       kun_stem=kun_stem,
+                       okurigana=okurigana,
+                       strokes=extract_strokes(content1),
+                       components=extract_components(content2))
 
-    return G
+
+def parse_file(filename) -> List[KanjiRecord]:
+    with open(filename, 'r', encoding='utf-8') as f:
+        return [parse_item(item) for item in json.load(f)]
 
 
-def add_common_words(G):
+def iter_parsed_files(filenames: List[str], processes=None) -> Iterator[Tuple[str, List[KanjiRecord]]]:
     """
-    add most commonly used word to each node
-    Returns: the resulting graph
+    Parse the files in a process pool and yield (filename, records) in file order.
+    Only the parsed records are sent back, the raw html stays in the worker processes.
     """
-    with open('data/common_words.txt', 'r', encoding='utf-8') as f:
-        for level, line in enumerate(f):
-            for pos, kanji in enumerate([node for node in G.nodes if G.nodes[node]['level'] == 7 - level]):
-                G.nodes[kanji]['common_word'] = line.split(',')[pos].strip()
-                # issue warning if kanji is not in word
-                if kanji not in G.nodes[kanji]['common_word']:
-                    print(f'Warning: {kanji} not in {G.nodes[kanji]["common_word"]}')
+    if not filenames:
+        return
+    with Pool(processes) as pool:
+        yield from zip(filenames, pool.imap(parse_file, filenames))
+
+
+def iter_records(filenames: List[str], processes=None) -> Iterator[KanjiRecord]:
+    for _, records in iter_parsed_files(filenames, processes):
+        yield from records
+
+
+def file_hash(filename) -> str:
+    with open(filename, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def load_manifest(path=MANIFEST_PATH) -> dict:
+    """
+    State of the last build: content hash and parsed records of every data file, and the content hash of every
+    other input (None if it was missing): {'files': {filename: {'hash': ..., 'records': [...]}}, 'inputs': {...}}
+    """
+    if not os.path.exists(path):
+        return {'files': {}, 'inputs': {}}
+    with open(path, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    # older manifests only hold the data files
+    if 'files' not in manifest:
+        manifest = {'files': manifest, 'inputs': {}}
+    return manifest
+
+
+def save_manifest(manifest: dict, path=MANIFEST_PATH):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False)
+
+
+def input_hashes(filenames: List[str]) -> dict:
+    return {filename: file_hash(filename) if os.path.exists(filename) else None for filename in filenames}
+
+
+def update_manifest(manifest: dict, filenames: List[str], processes=None) -> bool:
+    """
+    manifest: the data files of the build manifest, {filename: {'hash': ..., 'records': [...]}}
+    Reparse the files whose content hash differs from the manifest and drop files that are gone.
+    Returns whether any parsed record changed.
+    """
+    hashes = {filename: file_hash(filename) for filename in filenames}
+    changed = [filename for filename in filenames
+               if manifest.get(filename, {}).get('hash') != hashes[filename]
+               or manifest[filename].get('parser') != PARSER_VERSION]
+    modified = False
+    for filename, records in iter_parsed_files(changed, processes):
+        print(f'Parsed {filename}')
+        # same representation as after a JSON round trip
+        records = json.loads(json.dumps(records, ensure_ascii=False))
+        modified |= manifest.get(filename, {}).get('records') != records
+        manifest[filename] = {'hash': hashes[filename], 'parser': PARSER_VERSION, 'records': records}
+    for filename in set(manifest) - set(filenames):
+        del manifest[filename]
+        modified = True
+    return modified
+
+
+def manifest_records(manifest: dict, filenames: List[str]) -> Iterator[KanjiRecord]:
+    for filename in filenames:
+        for record in manifest[filename]['records']:
+            yield KanjiRecord(*record)
+
+
+def add_record(G, record: KanjiRecord):
+    kanji = record.kanji
+    if kanji not in G:
+        G.add_node(kanji, level=record.level, reading_on=record.reading_on, reading_kun=record.reading_kun,
+                   kun_stem=record.kun_stem, okurigana=record.okurigana, strokes=record.strokes)
+    else:
+        G.nodes[kanji]['level'] = record.level
+        if record.reading_on:
+            G.nodes[kanji]['reading_on'] = record.reading_on
+        if record.reading_kun:
+            G.nodes[kanji]['reading_kun'] = record.reading_kun
+            G.nodes[kanji]['kun_stem'] = record.kun_stem
+            G.nodes[kanji]['okurigana'] = record.okurigana
+        G.nodes[kanji]['strokes'] = record.strokes
+    for component in record.components:
+        if component not in G:
+            G.add_node(component, level=-1)  # mark as non-existent kanji
+        G.add_edge(component, kanji)  # relationship is component -> kanji
+
+
+def create_graph_from_records(records: Iterable[KanjiRecord]):
+    G = nx.DiGraph()
+    for record in records:
+        add_record(G, record)
     return G
 
 
-def add_words():
+def create_graph(data):
+    return create_graph_from_records(parse_item(item) for item in data)
+
+
+def add_common_words(G, path=COMMON_WORDS_PATH):
     """
-    Add words to the graph and connect with kanji. Work in progress.
+    add most commonly used word to each node. Line i of the file lists the words of the kanji of level 7 - i,
+    in node order
+    Returns: the resulting graph
     """
-    with open('data/common_words.csv', 'r', encoding='utf-8') as f:
-        reader = csv.reader(f)
-        for row in reader:
-            for word in row[1:]:
-                if word not in G:
-                    G.add_node(word, level=-1, entity='word')
-                for character in word:
-                    G.add_edge(character, word)
+    # group the nodes by level once instead of rescanning the graph for every line
+    nodes_by_level = defaultdict(list)
+    for node, level in G.nodes(data='level'):
+        nodes_by_level[level].append(node)
+    with open(path, 'r', encoding='utf-8') as f:
+        for line_number, line in enumerate(f):
+            words = line.split(',')
+            for pos, kanji in enumerate(nodes_by_level.get(7 - line_number, [])):
+                common_word = words[pos].strip()
+                G.nodes[kanji]['common_word'] = common_word
+                # issue warning if kanji is not in word
+                if kanji not in common_word:
+                    print(f'Warning: {kanji} not in {common_word}')
+    return G
 
 
 def write_nodes_to_csv(G, filename):
@@ -125,8 +268,9 @@ def write_nodes_to_csv(G, filename):
         writer = csv.writer(file)
         writer.writerow(['Id', 'Level', 'Reading_On', 'Reading_Kun', 'Strokes'])  # Header
         for node, attrs in G.nodes(data=True):
-            writer.writerow([node, attrs.get('level', -1), attrs.get('reading_on', ''),
-                             attrs.get('reading_kun', ''), attrs.get('strokes', -1)])
+            # readings as JSON lists
+            writer.writerow([node, attrs.get('level', -1), json.dumps(attrs.get('reading_on', []), ensure_ascii=False),
+                             json.dumps(attrs.get('reading_kun', []), ensure_ascii=False), attrs.get('strokes', -1)])
 
 
 def write_edges_to_csv(G, filename):
@@ -137,16 +281,60 @@ def write_edges_to_csv(G, filename):
             writer.writerow([source, target])
 
 
-if __name__ == "__main__":
-    # read in all files and create a graph
-    kanji_data = []
-    for i in range(100, 11800, 100):
-        with open(f'data/kanji_data_{i}.json', 'r', encoding='utf-8') as f:
-            print(f'Reading file kanji_data_{i}.json')
-            kanji_data.extend(json.load(f))
-    G = create_graph(kanji_data)
-    G = add_common_words(G)
-    nx.write_gexf(G, 'data/kanji_digraph.gexf')
+def output_paths() -> List[str]:
+    """
+    Files written by write_outputs
+    """
+    snapshot = snapshot_path(GEXF_PATH)
+    paths = [GEXF_PATH, str(snapshot / 'meta.json'), str(snapshot / INDEX_FILENAME), NPZ_PATH,
+             'data/kanji_nodes.csv', 'data/kanji_edges.csv']
+    if os.path.exists(WORDS_CSV_PATH):
+        paths.append(str(snapshot / WORD_INDEX_FILENAME))
+    if HAS_PARQUET:
+        paths += [f'data/{NODES_PARQUET}', f'data/{EDGES_PARQUET}']
+    return paths
+
+
+def write_outputs(G):
+    write_gexf(G, GEXF_PATH)
+    write_snapshot(G, snapshot_path(GEXF_PATH))
+    similar_index = SimilarKanjiIndex.from_graph(G)
+    similar_index.save(snapshot_path(GEXF_PATH) / INDEX_FILENAME)
+    # words of the multi-word list, with the graph node order
+    if os.path.exists(WORDS_CSV_PATH):
+        start = time.perf_counter()
+        WordIndex.from_csv(list(G.nodes)).save(snapshot_path(GEXF_PATH) / WORD_INDEX_FILENAME)
+        print(f'Built word index in {time.perf_counter() - start:.3f} s')
+    # columnar exports with typed and list columns, written in bulk; the CSV files are kept for Gephi
+    write_npz(G, NPZ_PATH, similar_index.arrays(EXPORT_PREFIX))
+    if HAS_PARQUET:
+        write_parquet(GraphSnapshot(NPZ_PATH), 'data')
     write_nodes_to_csv(G, 'data/kanji_nodes.csv')
     write_edges_to_csv(G, 'data/kanji_edges.csv')
-    print('Graph created')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Create the kanji graph from the scraped data')
+    parser.add_argument('--incremental', action='store_true',
+                        help='only reparse data files that changed since the last build')
+    args = parser.parse_args()
+
+    # parse all (or only the changed) files in parallel
+    manifest = load_manifest() if args.incremental else {'files': {}, 'inputs': {}}
+    modified = update_manifest(manifest['files'], DATA_FILES)
+    inputs = input_hashes(INPUT_FILES)
+    missing = [path for path in output_paths() if not os.path.exists(path)]
+    if args.incremental and not modified and manifest['inputs'] == inputs and not missing:
+        print('Graph is up to date')
+    else:
+        # assembling the graph from parsed records takes well under a second, so the graph is rebuilt in file
+        # order instead of patched. This keeps node order, which add_common_words relies on, identical to a full build
+        G = create_graph_from_records(manifest_records(manifest['files'], DATA_FILES))
+        start = time.perf_counter()
+        G = add_common_words(G)
+        print(f'Added common words in {time.perf_counter() - start:.3f} s')
+        write_outputs(G)
+        manifest['inputs'] = inputs
+        print('Graph created')
+    # also when nothing was rebuilt: files whose hash changed without changing their records are not reparsed again
+    save_manifest(manifest)
@@ -0,0 +1,63 @@
+# node and edge tables of the kanji graph with proper dtypes and list columns, for analytics with pandas
+from pathlib import Path
+from typing import List
+
+import numpy as np
+import pandas as pd
+
+from src.graph_snapshot import GraphSnapshot
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PARQUET = True
+except ImportError:
+    HAS_PARQUET = False
+
+NODES_PARQUET = 'kanji_nodes.parquet'
+EDGES_PARQUET = 'kanji_edges.parquet'
+
+
+def _rows(indptr: np.ndarray, values: np.ndarray) -> List[List[str]]:
+    indptr = indptr.tolist()
+    values = values.tolist()
+    return [values[start:end] for start, end in zip(indptr[:-1], indptr[1:])]
+
+
+def nodes_frame(snapshot: GraphSnapshot) -> pd.DataFrame:
+    """
+    One row per node: id, level (int8, -1 for components that are no kanji), strokes (int16, -1 if unknown),
+    common_word and the readings, kun reading stems and okurigana as lists of strings
+    """
+    return pd.DataFrame({
+        'id': snapshot.ids.tolist(),
+        'level': np.asarray(snapshot.level),
+        'strokes': np.asarray(snapshot.strokes),
+        'common_word': snapshot.common_word.tolist(),
+        'reading_on': _rows(snapshot.reading_on_indptr, snapshot.reading_on_values),
+        'reading_kun': _rows(snapshot.reading_kun_indptr, snapshot.reading_kun_values),
+        'kun_stem': _rows(snapshot.reading_kun_indptr, snapshot.kun_stem_values),
+        'okurigana': _rows(snapshot.reading_kun_indptr, snapshot.okurigana_values),
+    })
+
+
+def edges_frame(snapshot: GraphSnapshot) -> pd.DataFrame:
+    """
+    One row per edge from component to compound, in the order of the CSV export
+    """
+    ids = np.asarray(snapshot.ids)
+    sources = np.repeat(np.arange(len(ids)), np.diff(snapshot.succ_indptr))
+    return pd.DataFrame({'source': ids[sources].tolist(), 'target': ids[snapshot.succ_indices].tolist()})
+
+
+def write_parquet(snapshot: GraphSnapshot, directory):
+    """
+    Write the node and edge tables as Parquet files into directory, requires pyarrow
+    """
+    directory = Path(directory)
+    nodes_frame(snapshot).to_parquet(directory / NODES_PARQUET, index=False)
+    edges_frame(snapshot).to_parquet(directory / EDGES_PARQUET, index=False)
+
+
+def read_parquet(directory) -> (pd.DataFrame, pd.DataFrame):
+    directory = Path(directory)
+    return pd.read_parquet(directory / NODES_PARQUET), pd.read_parquet(directory / EDGES_PARQUET)
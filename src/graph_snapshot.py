@@ -0,0 +1,302 @@
+# compact, memory-mappable snapshot of the kanji digraph
+import ast
+import json
+from pathlib import Path
+from typing import List
+
+import networkx as nx
+import numpy as np
+
+SNAPSHOT_SUFFIX = '.snapshot'
+# single file export with the same arrays, for analytics and for shipping the graph
+EXPORT_SUFFIX = '.npz'
+SNAPSHOT_VERSION = 3
+# list valued node attributes, stored as JSON strings in GEXF files
+LIST_ATTRIBUTES = ('reading_on', 'reading_kun', 'kun_stem', 'okurigana')
+# arrays of graph_arrays, read by GraphSnapshot
+ARRAY_NAMES = ('ids', 'level', 'strokes', 'common_word', 'succ_indptr', 'succ_indices', 'pred_indptr', 'pred_indices',
+               'reading_on_indptr', 'reading_on_values', 'reading_kun_indptr', 'reading_kun_values', 'kun_stem_values',
+               'okurigana_values')
+
+
+def snapshot_path(gexf_path) -> Path:
+    """
+    Path of the snapshot directory that belongs to a GEXF file, e.g. data/kanji_digraph.snapshot
+    """
+    return Path(gexf_path).with_suffix(SNAPSHOT_SUFFIX)
+
+
+def split_kun_reading(reading: str) -> (str, str):
+    """
+    Split a kun reading into stem and okurigana, e.g. も（つ） into も and つ
+    """
+    stem, _, okurigana = reading.partition('（')
+    return stem, okurigana.split('）')[0]
+
+
+def split_kun_readings(readings) -> (List[str], List[str]):
+    """
+    Stems and okurigana of a list of kun readings, see split_kun_reading
+    """
+    split = [split_kun_reading(reading) for reading in readings]
+    return [stem for stem, _ in split], [okurigana for _, okurigana in split]
+
+
+def _as_list(value) -> List[str]:
+    # GEXF files store lists as JSON, older ones as "['a', 'b']"; both are Python literals
+    if isinstance(value, str):
+        return list(ast.literal_eval(value)) if len(value) > 2 else []
+    return list(value) if value else []
+
+
+def write_gexf(G: nx.DiGraph, path):
+    """
+    Write the graph as GEXF, with list attributes encoded as JSON strings
+    """
+    H = G.copy()
+    for _, attrs in H.nodes(data=True):
+        for name in LIST_ATTRIBUTES:
+            if name in attrs:
+                attrs[name] = json.dumps(list(attrs[name]), ensure_ascii=False)
+    nx.write_gexf(H, path)
+
+
+def read_gexf(path) -> nx.DiGraph:
+    """
+    Read a GEXF file written by write_gexf, or an older one with readings stored as str(list)
+    """
+    G = nx.read_gexf(path)
+    for _, attrs in G.nodes(data=True):
+        for name in LIST_ATTRIBUTES:
+            if name in attrs:
+                attrs[name] = _as_list(attrs[name])
+        if 'reading_kun' in attrs and ('kun_stem' not in attrs or 'okurigana' not in attrs):
+            attrs['kun_stem'], attrs['okurigana'] = split_kun_readings(attrs['reading_kun'])
+    return G
+
+
+def _csr(rows, n, dtype=np.int32):
+    """
+    Convert a list of per-node lists into (indptr, values) arrays
+    """
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    indptr[1:] = np.cumsum([len(row) for row in rows])
+    values = [value for row in rows for value in row]
+    return indptr, np.asarray(values, dtype=dtype)
+
+
+def _str_array(values):
+    # fixed width unicode arrays can be memory-mapped, object arrays cannot
+    width = max((len(value) for value in values), default=1) or 1
+    return np.asarray(values, dtype=f'<U{width}')
+
+
+def graph_arrays(G: nx.DiGraph) -> dict:
+    """
+    Node ids, level/strokes columns, CSR successor/predecessor arrays and pre-split readings of the graph
+    """
+    ids = list(G.nodes)
+    index = {node: i for i, node in enumerate(ids)}
+    n = len(ids)
+    attrs = [G.nodes[node] for node in ids]
+
+    arrays = {
+        'ids': _str_array(ids),
+        'level': np.asarray([a.get('level', -1) for a in attrs], dtype=np.int8),
+        # -1 marks nodes that were only seen as a component, i.e. have no strokes/readings
+        'strokes': np.asarray([a.get('strokes', -1) for a in attrs], dtype=np.int16),
+        'common_word': _str_array([a.get('common_word', '') for a in attrs]),
+    }
+    arrays['succ_indptr'], arrays['succ_indices'] = _csr([[index[v] for v in G.successors(u)] for u in ids], n)
+    arrays['pred_indptr'], arrays['pred_indices'] = _csr([[index[v] for v in G.predecessors(u)] for u in ids], n)
+    for reading_type in ('reading_on', 'reading_kun'):
+        indptr, values = _csr([_as_list(a.get(reading_type)) for a in attrs], n, dtype=object)
+        arrays[f'{reading_type}_indptr'] = indptr
+        arrays[f'{reading_type}_values'] = _str_array(list(values))
+    # stem and okurigana of every kun reading, share reading_kun_indptr
+    split = [(_as_list(a['kun_stem']), _as_list(a['okurigana'])) if 'kun_stem' in a and 'okurigana' in a else
+             split_kun_readings(_as_list(a.get('reading_kun'))) for a in attrs]
+    arrays['kun_stem_values'] = _str_array([value for stems, _ in split for value in stems])
+    arrays['okurigana_values'] = _str_array([value for _, okurigana in split for value in okurigana])
+    return arrays
+
+
+def _edge_order(succ_indptr: List[int], succ_indices: List[int],
+                pred_indptr: List[int], pred_indices: List[int]) -> List[int]:
+    """
+    Positions in succ_indices in an order that, when the edges are added one by one, reproduces both the successor
+    and the predecessor order of the CSR arrays, i.e. a merge of all successor and predecessor rows
+    """
+    n = len(succ_indptr) - 1
+    if len(pred_indices) != len(succ_indices):
+        raise ValueError(f'{len(succ_indices)} successor and {len(pred_indices)} predecessor entries')
+    position = {}
+    sources = []
+    for u in range(n):
+        for p in range(succ_indptr[u], succ_indptr[u + 1]):
+            position[u, succ_indices[p]] = p
+            sources.append(u)
+    if len(position) != len(succ_indices):
+        raise ValueError('Duplicate edges in the successor arrays')
+    # the edge after each edge in its predecessor row, and how many edges have to be added before each edge
+    pred_next = [-1] * len(succ_indices)
+    waiting = [0 if p == succ_indptr[u] else 1 for p, u in enumerate(sources)]
+    for v in range(n):
+        row = [position.get((u, v), -1) for u in pred_indices[pred_indptr[v]:pred_indptr[v + 1]]]
+        if -1 in row:
+            raise ValueError(f'Predecessor arrays hold edges to node {v} that the successor arrays do not')
+        for p, q in zip(row, row[1:]):
+            pred_next[p] = q
+            waiting[q] += 1
+    order = []
+    ready = [p for p, count in enumerate(waiting) if count == 0]
+    while ready:
+        p = ready.pop()
+        order.append(p)
+        for q in (p + 1 if p + 1 < succ_indptr[sources[p] + 1] else -1, pred_next[p]):
+            if q >= 0:
+                waiting[q] -= 1
+                if waiting[q] == 0:
+                    ready.append(q)
+    if len(order) != len(succ_indices):
+        # the successor and predecessor orders contradict each other, no insertion order reproduces both
+        raise ValueError(f'Successor and predecessor orders contradict each other, '
+                         f'ordered {len(order)} of {len(succ_indices)} edges')
+    return order
+
+
+def _meta(G: nx.DiGraph) -> dict:
+    return {'version': SNAPSHOT_VERSION, 'nodes': G.number_of_nodes(), 'edges': G.number_of_edges()}
+
+
+def write_snapshot(G: nx.DiGraph, path):
+    """
+    Write the graph as a directory of .npy arrays, see graph_arrays
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+    for name, array in graph_arrays(G).items():
+        np.save(path / f'{name}.npy', array)
+    with open(path / 'meta.json', 'w', encoding='utf-8') as f:
+        json.dump(_meta(G), f)
+
+
+def write_npz(G: nx.DiGraph, path, extra=None):
+    """
+    Write the snapshot arrays into a single compressed .npz file, which GraphSnapshot and load_graph also read.
+    extra holds further arrays to ship with the graph, e.g. those of the similar kanji index
+    """
+    np.savez_compressed(path, meta=np.asarray(json.dumps(_meta(G))), **graph_arrays(G), **(extra or {}))
+
+
+class GraphSnapshot:
+    """
+    Read-only view of a snapshot directory. Arrays are memory-mapped, so opening is cheap
+    and worker processes share the pages of the OS file cache.
+    Also reads the single file export of write_npz, whose arrays are decompressed on load instead.
+    """
+
+    def __init__(self, path, mmap_mode='r'):
+        self.path = Path(path)
+        if self.path.suffix == EXPORT_SUFFIX:
+            with np.load(self.path) as data:
+                # further arrays of the export are read by their owners, see write_npz
+                arrays = {name: data[name] for name in ('meta',) + ARRAY_NAMES}
+            self.meta = json.loads(str(arrays['meta']))
+            load = arrays.__getitem__
+        else:
+            with open(self.path / 'meta.json', encoding='utf-8') as f:
+                self.meta = json.load(f)
+
+            def load(name):
+                return np.load(self.path / f'{name}.npy', mmap_mode=mmap_mode)
+        if self.meta['version'] != SNAPSHOT_VERSION:
+            raise ValueError(f'Unsupported snapshot version {self.meta["version"]} in {self.path}')
+
+        self.ids = load('ids')
+        self.level = load('level')
+        self.strokes = load('strokes')
+        self.common_word = load('common_word')
+        self.succ_indptr = load('succ_indptr')
+        self.succ_indices = load('succ_indices')
+        self.pred_indptr = load('pred_indptr')
+        self.pred_indices = load('pred_indices')
+        self.reading_on_indptr = load('reading_on_indptr')
+        self.reading_on_values = load('reading_on_values')
+        self.reading_kun_indptr = load('reading_kun_indptr')
+        self.reading_kun_values = load('reading_kun_values')
+        self.kun_stem_values = load('kun_stem_values')
+        self.okurigana_values = load('okurigana_values')
+
+    def __len__(self):
+        return len(self.ids)
+
+    def readings(self, i: int, reading_type: str) -> List[str]:
+        indptr = getattr(self, f'{reading_type}_indptr')
+        values = getattr(self, f'{reading_type}_values')
+        return values[indptr[i]:indptr[i + 1]].tolist()
+
+    def kun_stems(self, i: int) -> List[str]:
+        return self.kun_stem_values[self.reading_kun_indptr[i]:self.reading_kun_indptr[i + 1]].tolist()
+
+    def okurigana(self, i: int) -> List[str]:
+        return self.okurigana_values[self.reading_kun_indptr[i]:self.reading_kun_indptr[i + 1]].tolist()
+
+    def to_networkx(self) -> nx.DiGraph:
+        """
+        Rebuild the networkx graph with the same node attributes as read_gexf.
+        Raises ValueError if the successor and predecessor arrays do not match
+        """
+        ids = self.ids.tolist()
+        levels = self.level.tolist()
+        strokes = self.strokes.tolist()
+        common_words = self.common_word.tolist()
+        on_indptr, on_values = self.reading_on_indptr.tolist(), self.reading_on_values.tolist()
+        kun_indptr, kun_values = self.reading_kun_indptr.tolist(), self.reading_kun_values.tolist()
+        kun_stems = self.kun_stem_values.tolist()
+        okurigana = self.okurigana_values.tolist()
+
+        nodes = []
+        for i, node in enumerate(ids):
+            attrs = {'level': levels[i]}
+            if strokes[i] >= 0:
+                attrs['strokes'] = strokes[i]
+                attrs['reading_on'] = on_values[on_indptr[i]:on_indptr[i + 1]]
+                attrs['reading_kun'] = kun_values[kun_indptr[i]:kun_indptr[i + 1]]
+                attrs['kun_stem'] = kun_stems[kun_indptr[i]:kun_indptr[i + 1]]
+                attrs['okurigana'] = okurigana[kun_indptr[i]:kun_indptr[i + 1]]
+            if common_words[i]:
+                attrs['common_word'] = common_words[i]
+            nodes.append((node, attrs))
+
+        G = nx.DiGraph()
+        G.add_nodes_from(nodes)
+        succ_indptr = self.succ_indptr.tolist()
+        succ_indices = self.succ_indices.tolist()
+        sources = np.repeat(np.arange(len(ids)), np.diff(self.succ_indptr)).tolist()
+        # networkx orders predecessors by edge insertion, so adding the edges by source would reorder the
+        # components, and with them the heaviest component on stroke ties, compared to ArrayKanjiGraph
+        order = _edge_order(succ_indptr, succ_indices, self.pred_indptr.tolist(), self.pred_indices.tolist())
+        G.add_edges_from((ids[sources[p]], ids[succ_indices[p]]) for p in order)
+        return G
+
+
+def load_graph(path) -> nx.DiGraph:
+    """
+    Load the kanji graph, preferring the snapshot next to a GEXF file over parsing the XML
+    """
+    path = Path(path)
+    if path.suffix in (SNAPSHOT_SUFFIX, EXPORT_SUFFIX):
+        return GraphSnapshot(path).to_networkx()
+    snapshot = snapshot_path(path)
+    # ignore snapshots that are older than the GEXF file they were written for. write_snapshot overwrites the
+    # arrays in place, so only meta.json, which is written last, tells when the snapshot was last written
+    meta = snapshot / 'meta.json'
+    if meta.exists() and (not path.exists() or meta.stat().st_mtime >= path.stat().st_mtime):
+        try:
+            return GraphSnapshot(snapshot).to_networkx()
+        except ValueError:
+            if not path.exists():
+                raise
+            # written by an older version or inconsistent, fall back to the GEXF file
+    return read_gexf(path)
@@ -1,67 +1,116 @@
-from typing import List
+import itertools
+from pathlib import Path
+from typing import Iterator, List, Tuple
 
-import networkx as nx
+import numpy as np
+
+from src.graph_snapshot import EXPORT_SUFFIX, SNAPSHOT_SUFFIX, GraphSnapshot, load_graph, snapshot_path
+from src.similar_index import SimilarKanjiIndex
+from src.tracing import tracer
+from src.word_index import load_word_index
 
 
 class KanjiGraph:
-    def __init__(self, path):
-        self.G = nx.read_gexf(path)
+    def __init__(self, path, use_similar_index=False):
+        # loads data/kanji_digraph.snapshot instead of the GEXF file if it exists, also accepts a .npz export
+        self.G = load_graph(path)
+        # answer get_similar_kanji from a precomputed table instead of walking the graph
+        self.similar_index = SimilarKanjiIndex.from_graph(self.G) if use_similar_index else None
+        self.path = path
+        self._readings = {}
+        self._word_index = None
+        self._position = None
 
     def get_components(self, kanji: str) -> List[str]:
         return list(self.G.predecessors(kanji))
 
-    def get_readings(self, kanji: str) -> (List[str], List[str]):
-        reading_on = self.G.nodes[kanji]['reading_on']
-        reading_kun = self.G.nodes[kanji]['reading_kun']
-        # convert "['a', 'b']" to ["a", "b"]
-        reading_on = reading_on[1:-1].replace("'", "").split(', ') if len(reading_on) > 2 else []
-        reading_kun = reading_kun[1:-1].replace("'", "").split(', ') if len(reading_kun) > 2 else []
-        return reading_on, reading_kun
-
-    def get_similar_kanji_deep(self, kanji, depth=0, similar_kanji=None, height=0, level_limit=0, depth_limit=2) -> List[str]:
-        if similar_kanji is None:
-            similar_kanji = []
-        similar_kanji_set = set(similar_kanji)
-
-        if depth > depth_limit:
-            return similar_kanji
-
-        # components of the kanji (predecessors)
-        for component in self.G.predecessors(kanji):
-            if (component, depth) not in similar_kanji_set:
-                if self.G.nodes[component]['level'] >= level_limit:
-                    similar_kanji.append((component, depth, height - 1))
-                    similar_kanji_set.add((component, depth, height - 1))
-                self.get_similar_kanji_deep(component, depth + 1, similar_kanji, height - 1, level_limit, depth_limit)
-
-        # kanji that contain the kanji as component (successors)
-        for compound in self.G.successors(kanji):
-            if (compound, depth, height) not in similar_kanji_set:
-                if self.G.nodes[compound]['level'] >= level_limit:
-                    similar_kanji.append((compound, depth, height + 1))
-                    similar_kanji_set.add((compound, depth, height + 1))
-                self.get_similar_kanji_deep(compound, depth + 1, similar_kanji, height + 1, level_limit, depth_limit)
-
-        return similar_kanji
+    def get_compounds(self, kanji: str) -> List[str]:
+        return list(self.G.successors(kanji))
+
+    def get_readings(self, kanji: str) -> (Tuple[str, ...], Tuple[str, ...]):
+        readings = self._readings.get(kanji)
+        if readings is None:
+            attrs = self.G.nodes[kanji]
+            readings = tuple(attrs.get('reading_on', ())), tuple(attrs.get('reading_kun', ()))
+            self._readings[kanji] = readings
+        return readings
+
+    def get_kun_stems(self, kanji: str) -> Tuple[str, ...]:
+        """
+        Stem of every kun reading, split off at build time, e.g. も for も（つ）
+        """
+        return tuple(self.G.nodes[kanji].get('kun_stem', ()))
+
+    def get_okurigana(self, kanji: str) -> Tuple[str, ...]:
+        """
+        Okurigana of every kun reading, split off at build time, e.g. つ for も（つ）
+        """
+        return tuple(self.G.nodes[kanji].get('okurigana', ()))
+
+    def iter_similar_kanji_deep(self, kanji, level_limit=0, depth_limit=2) -> Iterator[Tuple[str, int, int]]:
+        """
+        Breadth-first neighborhood of a kanji. Yields (kanji, depth, height) once per reachable kanji with its
+        shortest depth (0 for direct components and compounds) and the net number of steps towards compounds
+        along that path (negative for components). Kanji below level_limit are passed through but not yielded.
+        """
+        visited = {kanji}
+        frontier = [(kanji, 0)]
+        depth = 0
+        try:
+            while frontier and depth <= depth_limit:
+                next_frontier = []
+                for node, height in frontier:
+                    neighbors = itertools.chain(((component, height - 1) for component in self.G.predecessors(node)),
+                                                ((compound, height + 1) for compound in self.G.successors(node)))
+                    for neighbor, neighbor_height in neighbors:
+                        if neighbor not in visited:
+                            visited.add(neighbor)
+                            next_frontier.append((neighbor, neighbor_height))
+                            if self.G.nodes[neighbor]['level'] >= level_limit:
+                                yield neighbor, depth, neighbor_height
+                frontier = next_frontier
+                depth += 1
+        finally:
+            tracer.count('similar_kanji_deep.visited', len(visited))
+
+    def get_similar_kanji_deep(self, kanji, level_limit=0, depth_limit=2) -> List[Tuple[str, int, int]]:
+        return list(self.iter_similar_kanji_deep(kanji, level_limit, depth_limit))
 
     def get_similar_kanji(self, kanji: str, level_limit: int) -> (str, int, int):
         # TODO: use information about position of the component in the kanji
+        if self.similar_index is not None:
+            tracer.count('similar_kanji.index_lookups')
+            return self.similar_index.top_similar_kanji(kanji, level_limit)
         components = self.get_components(kanji)
         if len(components) == 0:
             return []
         components.sort(key=lambda x: self.G.nodes[x]['strokes'] if 'strokes' in self.G.nodes[x] else 1, reverse=True)
-        similar_kanji = list(self.get_successors(components[0], kanji))
+        similar_kanji = self._siblings(kanji, components)
+        tracer.count('similar_kanji.visited', len(components) + len(similar_kanji))
         return [item for item in similar_kanji if self.G.nodes[item]['level'] >= level_limit][0:min(2, len(similar_kanji))]
 
+    def _siblings(self, kanji: str, components: List[str]) -> List[str]:
+        """
+        Other compounds of the heaviest component (components[0]) in the order of SimilarKanjiIndex: by the number of
+        components shared with the kanji (descending), then by node order, so that all backends return the same list
+        """
+        if self._position is None:
+            self._position = {node: i for i, node in enumerate(self.G)}
+        shared = set(components)
+        siblings = [item for item in self.G.successors(components[0]) if item != kanji]
+        siblings.sort(key=lambda x: (-len(shared.intersection(self.G.predecessors(x))), self._position[x]))
+        return siblings
+
     def get_components_compounds_and_similar_kanji(self, kanji: str, level_limit: int):
         components = self.get_components(kanji)
         if len(components) == 0:
             return [], [], []
         compounds = list(self.G.successors(kanji))
         components.sort(key=lambda x: self.G.nodes[x]['strokes'] if 'strokes' in self.G.nodes[x] else 1, reverse=True)
+        if self.similar_index is not None:
+            return components, compounds, self.similar_index.similar_kanji(kanji, level_limit)
         # filter out kanji with level < level_limit
-        similar_kanji = list(self.get_successors(components[0], kanji))
-        similar_kanji = [item for item in similar_kanji if self.G.nodes[item]['level'] >= level_limit]
+        similar_kanji = [item for item in self._siblings(kanji, components) if self.G.nodes[item]['level'] >= level_limit]
         return components, compounds, similar_kanji
 
     def get_successors(self, component, kanji):
@@ -72,6 +121,165 @@ class KanjiGraph:
             return -1
         return self.G.nodes[kanji]['level']
 
+    def get_common_word(self, kanji: str) -> str:
+        return self.G.nodes[kanji].get('common_word', '')
+
+    def get_words(self, kanji: str) -> List[str]:
+        """
+        Words of data/common_words.csv written with the kanji, from the word index stored with the snapshot
+        """
+        if self._word_index is None:
+            self._word_index = load_word_index(self.path)
+        return self._word_index.words_with(kanji)
+
+    def __iter__(self):
+        return iter(self.G)
+
+    def __contains__(self, kanji):
+        return kanji in self.G
+
+
+def _gather(indptr: np.ndarray, indices: np.ndarray, rows: np.ndarray) -> (np.ndarray, np.ndarray):
+    """
+    Concatenated CSR rows, and for every entry the position of its row in rows
+    """
+    starts = indptr[rows]
+    counts = indptr[rows + 1] - starts
+    owners = np.repeat(np.arange(len(rows)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    return indices[starts[owners] + offsets], owners
+
+
+class ArrayKanjiGraph:
+    """
+    KanjiGraph backed by the arrays of a graph snapshot instead of networkx dicts.
+    Nodes are integer ids, attributes are NumPy columns and adjacency is stored as int32 CSR arrays,
+    which are memory-mapped and therefore shared between worker processes.
+    Similar kanji are answered from the SimilarKanjiIndex stored with the snapshot.
+    """
+    __slots__ = ('snapshot', 'ids', 'index', 'level', 'strokes', 'succ_indptr', 'succ_indices',
+                 'pred_indptr', 'pred_indices', 'similar_index', '_readings', '_word_index')
+
+    def __init__(self, path):
+        path = Path(path)
+        if path.suffix not in (SNAPSHOT_SUFFIX, EXPORT_SUFFIX):
+            path = snapshot_path(path)
+        self.snapshot = GraphSnapshot(path)
+        self.ids = self.snapshot.ids.tolist()
+        self.index = {kanji: i for i, kanji in enumerate(self.ids)}
+        self.level = self.snapshot.level
+        # nodes without strokes count as 1 stroke, like in KanjiGraph
+        self.strokes = np.where(self.snapshot.strokes < 0, 1, self.snapshot.strokes)
+        self.succ_indptr = self.snapshot.succ_indptr
+        self.succ_indices = self.snapshot.succ_indices
+        self.pred_indptr = self.snapshot.pred_indptr
+        self.pred_indices = self.snapshot.pred_indices
+        self.similar_index = SimilarKanjiIndex.load_for_snapshot(self.snapshot)
+        self._readings = {}
+        self._word_index = None
+
+    def _successors(self, i: int) -> np.ndarray:
+        return self.succ_indices[self.succ_indptr[i]:self.succ_indptr[i + 1]]
+
+    def _predecessors(self, i: int) -> np.ndarray:
+        return self.pred_indices[self.pred_indptr[i]:self.pred_indptr[i + 1]]
+
+    def _names(self, indices) -> List[str]:
+        return [self.ids[i] for i in indices.tolist()]
+
+    def get_components(self, kanji: str) -> List[str]:
+        return self._names(self._predecessors(self.index[kanji]))
+
+    def get_compounds(self, kanji: str) -> List[str]:
+        return self._names(self._successors(self.index[kanji]))
+
+    def get_readings(self, kanji: str) -> (Tuple[str, ...], Tuple[str, ...]):
+        readings = self._readings.get(kanji)
+        if readings is None:
+            i = self.index[kanji]
+            readings = tuple(self.snapshot.readings(i, 'reading_on')), tuple(self.snapshot.readings(i, 'reading_kun'))
+            self._readings[kanji] = readings
+        return readings
+
+    def get_kun_stems(self, kanji: str) -> Tuple[str, ...]:
+        return tuple(self.snapshot.kun_stems(self.index[kanji]))
+
+    def get_okurigana(self, kanji: str) -> Tuple[str, ...]:
+        return tuple(self.snapshot.okurigana(self.index[kanji]))
+
+    def iter_similar_kanji_deep(self, kanji, level_limit=0, depth_limit=2) -> Iterator[Tuple[str, int, int]]:
+        """
+        Level-synchronous version of KanjiGraph.iter_similar_kanji_deep, expands a whole depth at once with array ops
+        """
+        visited = np.zeros(len(self.ids), dtype=bool)
+        frontier = np.array([self.index[kanji]], dtype=np.int64)
+        heights = np.zeros(1, dtype=np.int64)
+        visited[frontier] = True
+        depth = 0
+        try:
+            while len(frontier) and depth <= depth_limit:
+                components, component_owners = _gather(self.pred_indptr, self.pred_indices, frontier)
+                compounds, compound_owners = _gather(self.succ_indptr, self.succ_indices, frontier)
+                neighbors = np.concatenate([components, compounds])
+                neighbor_heights = np.concatenate([heights[component_owners] - 1, heights[compound_owners] + 1])
+                # order like the sequential BFS: per frontier node, components before compounds
+                order = np.argsort(np.concatenate([component_owners * 2, compound_owners * 2 + 1]), kind='stable')
+                neighbors, neighbor_heights = neighbors[order], neighbor_heights[order]
+
+                unvisited = ~visited[neighbors]
+                neighbors, neighbor_heights = neighbors[unvisited], neighbor_heights[unvisited]
+                _, first = np.unique(neighbors, return_index=True)
+                first.sort()
+                frontier, heights = neighbors[first], neighbor_heights[first]
+                visited[frontier] = True
+
+                for i, height in zip(frontier.tolist(), heights.tolist()):
+                    if self.level[i] >= level_limit:
+                        yield self.ids[i], depth, height
+                depth += 1
+        finally:
+            tracer.count('similar_kanji_deep.visited', int(visited.sum()))
+
+    def get_similar_kanji_deep(self, kanji, level_limit=0, depth_limit=2) -> List[Tuple[str, int, int]]:
+        return list(self.iter_similar_kanji_deep(kanji, level_limit, depth_limit))
+
+    def get_similar_kanji(self, kanji: str, level_limit: int) -> (str, int, int):
+        tracer.count('similar_kanji.index_lookups')
+        return self.similar_index.top_similar_kanji(kanji, level_limit)
+
+    def get_components_compounds_and_similar_kanji(self, kanji: str, level_limit: int):
+        i = self.index[kanji]
+        if self.pred_indptr[i] == self.pred_indptr[i + 1]:
+            return [], [], []
+        components = self._predecessors(i)
+        # stable sort by strokes, descending
+        components = components[np.argsort(-self.strokes[components], kind='stable')]
+        return (self._names(components), self._names(self._successors(i)),
+                self.similar_index.similar_kanji(kanji, level_limit))
+
+    def get_successors(self, component, kanji):
+        return set(self._names(self._successors(self.index[component]))) - {kanji}
+
+    def get_level(self, kanji: str) -> int:
+        i = self.index.get(kanji)
+        if i is None:
+            return -1
+        return int(self.level[i])
+
+    def get_common_word(self, kanji: str) -> str:
+        return str(self.snapshot.common_word[self.index[kanji]])
+
+    def get_words(self, kanji: str) -> List[str]:
+        if self._word_index is None:
+            self._word_index = load_word_index(self.snapshot.path)
+        return self._word_index.words_with(kanji)
+
+    def __iter__(self):
+        return iter(self.ids)
+
+    def __contains__(self, kanji):
+        return kanji in self.index
+
 
 if __name__ == '__main__':
     # load graph
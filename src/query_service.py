@@ -0,0 +1,268 @@
+# long-running lookup service that keeps the kanji graph loaded, with a JSON API over local HTTP or a Unix socket
+#
+# start:  python -m src.query_service [--graph data/kanji_digraph.gexf] [--port 8765 | --unix /tmp/kanji.sock]
+# query:  curl -d '{"method": "similar_kanji", "params": {"kanji": "持", "level_limit": 5}}' localhost:8765/query
+# batch:  POST a JSON list of queries, the response is the list of results in the same order
+import argparse
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from src.main import ArrayKanjiGraph, KanjiGraph
+
+# method name -> (KanjiGraph method, default parameters besides kanji)
+METHODS = {
+    'components': ('get_components', {}),
+    'compounds': ('get_compounds', {}),
+    'readings': ('get_readings', {}),
+    'kun_stems': ('get_kun_stems', {}),
+    'okurigana': ('get_okurigana', {}),
+    'level': ('get_level', {}),
+    'common_word': ('get_common_word', {}),
+    'words': ('get_words', {}),
+    'similar_kanji': ('get_similar_kanji', {'level_limit': 0}),
+    'similar_kanji_deep': ('get_similar_kanji_deep', {'level_limit': 0, 'depth_limit': 2}),
+    'components_compounds_and_similar_kanji': ('get_components_compounds_and_similar_kanji', {'level_limit': 0}),
+}
+MAX_BODY_BYTES = 16 * 2 ** 20
+
+
+class QueryError(Exception):
+    pass
+
+
+class LRUCache:
+    """
+    Results of recent queries, keyed on method and parameters
+    """
+
+    def __init__(self, max_size=100_000):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {'hits': self.hits, 'misses': self.misses, 'entries': len(self.entries), 'max_size': self.max_size}
+
+
+class QueryService:
+    """
+    Answers queries like {"method": "similar_kanji", "params": {"kanji": "持", "level_limit": 5}} from a graph that is
+    loaded once. Lookups take microseconds, so they run directly on the event loop.
+    """
+
+    def __init__(self, graph, cache_size=100_000):
+        self.graph = graph
+        self.cache = LRUCache(cache_size) if cache_size else None
+        self.requests = 0
+        self.queries = 0
+        self.started = time.time()
+
+    def query(self, method: str, params: Optional[dict] = None):
+        if method not in METHODS:
+            raise QueryError(f'unknown method {method!r}, expected one of {", ".join(METHODS)}')
+        name, defaults = METHODS[method]
+        params = dict(params or {})
+        kanji = params.pop('kanji', None)
+        if not isinstance(kanji, str):
+            raise QueryError('params.kanji is required')
+        unknown = set(params) - set(defaults)
+        if unknown:
+            raise QueryError(f'unknown parameters for {method}: {", ".join(sorted(unknown))}')
+        params = {**defaults, **params}
+        if not all(isinstance(value, int) for value in params.values()):
+            raise QueryError(f'parameters of {method} must be integers')
+        self.queries += 1
+        key = (method, kanji, *params.values())
+        if self.cache is not None:
+            result = self.cache.get(key)
+            if result is not None:
+                return result
+        if kanji not in self.graph:
+            raise QueryError(f'unknown kanji {kanji!r}')
+        result = getattr(self.graph, name)(kanji, **params)
+        if self.cache is not None:
+            self.cache.put(key, result)
+        return result
+
+    def answer(self, request) -> dict:
+        """
+        Response to a single query, errors are reported per query so that one bad query does not fail a batch
+        """
+        if not isinstance(request, dict):
+            return {'error': 'a query is an object with method and params'}
+        try:
+            return {'result': self.query(request.get('method'), request.get('params'))}
+        except QueryError as e:
+            return {'error': str(e)}
+
+    def handle(self, payload):
+        self.requests += 1
+        if isinstance(payload, list):
+            return [self.answer(request) for request in payload]
+        return self.answer(payload)
+
+    def stats(self) -> dict:
+        return {'requests': self.requests, 'queries': self.queries, 'uptime': time.time() - self.started,
+                'nodes': sum(1 for _ in self.graph), 'cache': self.cache.stats() if self.cache else None}
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        # minimal HTTP/1.1 with keep-alive: POST /query with a JSON body, GET /stats
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                if length > MAX_BODY_BYTES:
+                    await self._send(writer, 413, {'error': 'request too large'})
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                if method == 'GET' and target == '/stats':
+                    await self._send(writer, 200, self.stats())
+                elif method == 'POST' and target == '/query':
+                    try:
+                        payload = json.loads(body)
+                    except ValueError as e:
+                        await self._send(writer, 400, {'error': f'invalid JSON: {e}'})
+                    else:
+                        await self._send(writer, 200, self.handle(payload))
+                else:
+                    await self._send(writer, 404, {'error': f'no route for {method} {target}'})
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (asyncio.IncompleteReadError, ConnectionResetError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _send(writer: asyncio.StreamWriter, status: int, payload):
+        data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        reason = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 413: 'Payload Too Large'}[status]
+        writer.write(f'HTTP/1.1 {status} {reason}\r\nContent-Type: application/json; charset=utf-8\r\n'
+                     f'Content-Length: {len(data)}\r\n\r\n'.encode('latin-1') + data)
+        await writer.drain()
+
+    async def start(self, host='127.0.0.1', port=8765, unix_path=None) -> asyncio.AbstractServer:
+        if unix_path:
+            return await asyncio.start_unix_server(self.handle_connection, unix_path)
+        return await asyncio.start_server(self.handle_connection, host, port)
+
+
+class QueryClient:
+    """
+    Async client that keeps one connection to the service open, for use from scripts and the benchmark
+    """
+
+    def __init__(self, host='127.0.0.1', port=8765, unix_path=None):
+        self.host = host
+        self.port = port
+        self.unix_path = unix_path
+        self.reader = None
+        self.writer = None
+
+    async def connect(self):
+        if self.unix_path:
+            self.reader, self.writer = await asyncio.open_unix_connection(self.unix_path)
+        else:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        return self
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            await self.writer.wait_closed()
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def request(self, method: str, target: str, payload=None):
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8') if payload is not None else b''
+        host = self.host if not self.unix_path else 'localhost'
+        self.writer.write(f'{method} {target} HTTP/1.1\r\nHost: {host}\r\nContent-Type: application/json\r\n'
+                          f'Content-Length: {len(body)}\r\n\r\n'.encode('latin-1') + body)
+        await self.writer.drain()
+        await self.reader.readline()
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b'\r\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            if name.strip().lower() == 'content-length':
+                length = int(value)
+        return json.loads(await self.reader.readexactly(length))
+
+    async def query(self, method: str, **params):
+        response = await self.request('POST', '/query', {'method': method, 'params': params})
+        if 'error' in response:
+            raise QueryError(response['error'])
+        return response['result']
+
+    async def batch(self, queries):
+        """
+        queries: list of {"method": ..., "params": {...}}; returns the list of {"result": ...} or {"error": ...}
+        """
+        return await self.request('POST', '/query', list(queries))
+
+    async def stats(self) -> dict:
+        return await self.request('GET', '/stats')
+
+
+async def serve(service: QueryService, host='127.0.0.1', port=8765, unix_path=None):
+    server = await service.start(host, port, unix_path)
+    address = unix_path or '{}:{}'.format(*server.sockets[0].getsockname()[:2])
+    print(f'Serving {sum(1 for _ in service.graph)} nodes on {address}')
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve kanji graph lookups over a local JSON API')
+    parser.add_argument('--graph', default='data/kanji_digraph.gexf')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', help='listen on this Unix socket instead of TCP')
+    parser.add_argument('--array', action='store_true', help='use ArrayKanjiGraph, which loads the graph snapshot')
+    parser.add_argument('--cache-size', type=int, default=100_000, help='LRU cache entries, 0 disables the cache')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    graph = ArrayKanjiGraph(args.graph) if args.array else KanjiGraph(args.graph, use_similar_index=True)
+    print(f'Loaded graph in {time.perf_counter() - start:.2f} s')
+    try:
+        asyncio.run(serve(QueryService(graph, args.cache_size), args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,175 @@
+# precomputed similar kanji for the whole graph, built with sparse matrix products
+import hashlib
+from pathlib import Path
+from typing import List
+
+import networkx as nx
+import numpy as np
+from scipy import sparse
+
+from src.graph_snapshot import EXPORT_SUFFIX, GraphSnapshot, graph_arrays
+
+INDEX_FILENAME = 'similar_index.npz'
+# prefix of the index arrays stored in the .npz export of the graph
+EXPORT_PREFIX = 'similar_index_'
+
+
+def _first_max_per_row(indptr: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """
+    Position of the first maximum of each non-empty CSR row, -1 for empty rows
+    """
+    n = len(indptr) - 1
+    counts = np.diff(indptr)
+    rows = np.repeat(np.arange(n), counts)
+    result = np.full(n, -1, dtype=np.int64)
+    if len(values) == 0:
+        return result
+    row_max = np.full(n, np.iinfo(np.int64).min)
+    np.maximum.at(row_max, rows, values)
+    positions = np.arange(len(values))
+    is_max = values == row_max[rows]
+    first = np.full(n, len(values))
+    np.minimum.at(first, rows[is_max], positions[is_max])
+    result[counts > 0] = first[counts > 0]
+    return result
+
+
+def graph_fingerprint(ids, level, strokes, pred_indptr, pred_indices) -> str:
+    """
+    Hash of everything the index is built from, to detect an index that belongs to another version of the graph
+    """
+    digest = hashlib.sha256('\n'.join(ids).encode('utf-8'))
+    for array in (level, strokes, pred_indptr, pred_indices):
+        digest.update(np.ascontiguousarray(array, dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+
+class SimilarKanjiIndex:
+    """
+    For every kanji, the other compounds of its heaviest component (the one with the most strokes),
+    ordered by the number of components they share with the kanji.
+    Besides the full lists, a table holds the first top_k entries for every level limit, so that
+    KanjiGraph.get_similar_kanji is a single lookup.
+    fingerprint is the graph_fingerprint of the graph the index was built from.
+    """
+
+    def __init__(self, ids, level, indptr, neighbors, shared, top, min_level, fingerprint=None):
+        self.ids = list(ids)
+        self.index = {kanji: i for i, kanji in enumerate(self.ids)}
+        self.level = level
+        self.indptr = indptr
+        self.neighbors = neighbors
+        self.shared = shared
+        self.top = top
+        self.min_level = min_level
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def build(cls, ids, level, strokes, pred_indptr, pred_indices, top_k=2):
+        n = len(ids)
+        fingerprint = graph_fingerprint(ids, level, strokes, pred_indptr, pred_indices)
+        level = np.asarray(level, dtype=np.int64)
+        # nodes without strokes count as 1 stroke, like in KanjiGraph
+        strokes = np.where(np.asarray(strokes) < 0, 1, strokes).astype(np.int64)
+        pred_indptr = np.asarray(pred_indptr)
+        pred_indices = np.asarray(pred_indices)
+
+        # incidence matrix: kanji x component
+        incidence = sparse.csr_matrix((np.ones(len(pred_indices), dtype=np.int32), pred_indices, pred_indptr),
+                                      shape=(n, n))
+        # heaviest component of every kanji as a kanji x component selection matrix
+        first = _first_max_per_row(pred_indptr, strokes[pred_indices])
+        has_components = first >= 0
+        heaviest = sparse.csr_matrix((np.ones(has_components.sum(), dtype=np.int32),
+                                      (np.flatnonzero(has_components), pred_indices[first[has_components]])),
+                                     shape=(n, n))
+        # kanji that contain the heaviest component, and the number of components shared with them
+        siblings = (heaviest @ incidence.T).tocsr()
+        shared = incidence @ incidence.T
+        shared = siblings.multiply(shared).tocoo()
+        keep = shared.row != shared.col
+        rows, cols, counts = shared.row[keep], shared.col[keep], shared.data[keep]
+
+        # sort every row by shared components (descending), then by node order
+        order = np.lexsort((cols, -counts, rows))
+        rows, cols, counts = rows[order], cols[order].astype(np.int32), counts[order].astype(np.int16)
+        indptr = np.zeros(n + 1, dtype=np.int64)
+        indptr[1:] = np.cumsum(np.bincount(rows, minlength=n))
+
+        # first top_k neighbors for every level limit from min_level up to max_level + 1
+        min_level = int(min(level.min(initial=0), 0))
+        limits = np.arange(min_level, level.max(initial=0) + 2)
+        top = np.full((n, len(limits), top_k), -1, dtype=np.int32)
+        for column, limit in enumerate(limits):
+            allowed = level[cols] >= limit
+            rank = np.cumsum(allowed) - 1
+            # rank within the row: subtract the number of allowed entries in earlier rows
+            row_start = np.concatenate([[0], np.cumsum(allowed)])[indptr[:-1]]
+            rank -= np.repeat(row_start, np.diff(indptr))
+            selected = allowed & (rank < top_k)
+            top[rows[selected], column, rank[selected]] = cols[selected]
+
+        return cls(ids, level.astype(np.int8), indptr, cols, counts, top, min_level, fingerprint)
+
+    @classmethod
+    def from_graph(cls, G: nx.DiGraph, top_k=2):
+        arrays = graph_arrays(G)
+        return cls.build(list(G.nodes), arrays['level'], arrays['strokes'],
+                         arrays['pred_indptr'], arrays['pred_indices'], top_k)
+
+    @classmethod
+    def from_snapshot(cls, snapshot: GraphSnapshot, top_k=2):
+        return cls.build(snapshot.ids.tolist(), snapshot.level, snapshot.strokes,
+                         snapshot.pred_indptr, snapshot.pred_indices, top_k)
+
+    def arrays(self, prefix='') -> dict:
+        arrays = dict(ids=np.asarray(self.ids), level=self.level, indptr=self.indptr, neighbors=self.neighbors,
+                      shared=self.shared, top=self.top, min_level=self.min_level, fingerprint=self.fingerprint)
+        return {prefix + name: array for name, array in arrays.items()}
+
+    def save(self, path):
+        np.savez(path, **self.arrays())
+
+    @classmethod
+    def load(cls, path, prefix=''):
+        """
+        Index saved with save, or stored with prefix in another .npz file. None if the file holds no index
+        """
+        with np.load(Path(path)) as data:
+            if prefix + 'ids' not in data.files:
+                return None
+            # indexes written before the fingerprint was stored never match a graph
+            fingerprint = str(data[prefix + 'fingerprint']) if prefix + 'fingerprint' in data.files else None
+            return cls(data[prefix + 'ids'].tolist(), data[prefix + 'level'], data[prefix + 'indptr'],
+                       data[prefix + 'neighbors'], data[prefix + 'shared'], data[prefix + 'top'],
+                       int(data[prefix + 'min_level']), fingerprint)
+
+    @classmethod
+    def load_for_snapshot(cls, snapshot: GraphSnapshot, path=None):
+        """
+        The index stored with the snapshot, in the snapshot directory or in the .npz export, rebuilt if it is missing
+        or was built for another graph, e.g. after the snapshot was rewritten. Stored again in a snapshot directory
+        """
+        exported = path is None and snapshot.path.suffix == EXPORT_SUFFIX
+        if path is None:
+            path = snapshot.path if exported else snapshot.path / INDEX_FILENAME
+        path = Path(path)
+        fingerprint = graph_fingerprint(snapshot.ids.tolist(), snapshot.level, snapshot.strokes,
+                                        snapshot.pred_indptr, snapshot.pred_indices)
+        if path.exists():
+            index = cls.load(path, EXPORT_PREFIX if exported else '')
+            if index is not None and index.fingerprint == fingerprint:
+                return index
+        index = cls.from_snapshot(snapshot)
+        if snapshot.path.is_dir():
+            index.save(path)
+        return index
+
+    def top_similar_kanji(self, kanji: str, level_limit: int) -> List[str]:
+        column = min(max(int(level_limit) - self.min_level, 0), self.top.shape[1] - 1)
+        return [self.ids[i] for i in self.top[self.index[kanji], column].tolist() if i >= 0]
+
+    def similar_kanji(self, kanji: str, level_limit: int) -> List[str]:
+        i = self.index[kanji]
+        neighbors = self.neighbors[self.indptr[i]:self.indptr[i + 1]]
+        return [self.ids[j] for j in neighbors[self.level[neighbors] >= level_limit].tolist()]
@@ -0,0 +1,112 @@
+# lightweight timing spans and counters for the worksheet pipeline, written as a JSON trace per run
+import cProfile
+import json
+import threading
+import time
+from contextlib import nullcontext
+from pathlib import Path
+
+# spans beyond this are only aggregated, not listed individually
+MAX_EVENTS = 10_000
+_NULL_SPAN = nullcontext()
+
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'start')
+
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.tracer.add_span(self.name, self.start, time.perf_counter() - self.start)
+
+
+class Tracer:
+    """
+    Collects spans (named wall time intervals) and counters. While disabled, span() returns a shared no-op
+    context manager and count() returns immediately, so instrumented code runs at practically full speed.
+    Spans are flat rather than nested, since they also come from worker threads and concurrent coroutines.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.profiler = None
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.started = time.perf_counter()
+        self.events = []
+        self.spans = {}
+        self.counters = {}
+
+    def configure(self, config):
+        """
+        config: the trace section of the hydra config, {enabled: bool, profile: bool}
+        """
+        config = config or {}
+        self.enabled = bool(config.get('enabled', False))
+        self.reset()
+        if config.get('profile', False):
+            self.profiler = cProfile.Profile()
+            self.profiler.enable()
+
+    def span(self, name: str):
+        if not self.enabled:
+            return _NULL_SPAN
+        return _Span(self, name)
+
+    def add_span(self, name: str, start: float, duration: float):
+        with self.lock:
+            if len(self.events) < MAX_EVENTS:
+                self.events.append({'name': name, 'start': start - self.started, 'duration': duration,
+                                    'thread': threading.current_thread().name})
+            stats = self.spans.get(name)
+            if stats is None:
+                self.spans[name] = {'count': 1, 'total': duration, 'max': duration}
+            else:
+                stats['count'] += 1
+                stats['total'] += duration
+                stats['max'] = max(stats['max'], duration)
+
+    def count(self, name: str, value=1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def report(self) -> dict:
+        return {'elapsed': time.perf_counter() - self.started,
+                'spans': dict(sorted(self.spans.items(), key=lambda item: -item[1]['total'])),
+                'counters': dict(sorted(self.counters.items())),
+                'events': self.events}
+
+    def write(self, directory) -> Path:
+        """
+        Write the trace (and the cProfile stats in profile mode) to directory/trace-<time>.json, returns its path
+        """
+        directory = Path(directory)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = directory / f'trace-{time.strftime("%Y%m%d-%H%M%S")}.json'
+        if self.profiler is not None:
+            self.profiler.disable()
+            # open with python -m pstats, snakeviz or flameprof
+            self.profiler.dump_stats(path.with_suffix('.prof'))
+            self.profiler = None
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2, ensure_ascii=False)
+        return path
+
+    def summary(self) -> str:
+        lines = [f'{name:24s} {stats["count"]:7d}x {stats["total"]:9.3f} s total, {stats["max"] * 1e3:9.1f} ms max'
+                 for name, stats in self.report()['spans'].items()]
+        lines += [f'{name:24s} {value}' for name, value in sorted(self.counters.items())]
+        return '\n'.join(lines)
+
+
+tracer = Tracer()
@@ -0,0 +1,94 @@
+# compact word -> kanji index of data/common_words.csv, kept next to the graph instead of inside it
+import csv
+from pathlib import Path
+from typing import Iterable, List
+
+import numpy as np
+
+from src.graph_snapshot import snapshot_path
+
+WORD_INDEX_FILENAME = 'word_index.npz'
+WORDS_CSV_PATH = 'data/common_words.csv'
+
+
+class WordIndex:
+    """
+    Words and the kanji they are written with, as CSR arrays in both directions.
+    Replaces adding every word as a graph node with an edge from each of its characters.
+    """
+
+    def __init__(self, kanji, words, word_indptr, word_kanji, kanji_indptr, kanji_words):
+        self.kanji = list(kanji)
+        self.words = list(words)
+        self.kanji_index = {kanji: i for i, kanji in enumerate(self.kanji)}
+        self.word_index = {word: i for i, word in enumerate(self.words)}
+        self.word_indptr = word_indptr
+        self.word_kanji = word_kanji
+        self.kanji_indptr = kanji_indptr
+        self.kanji_words = kanji_words
+
+    @classmethod
+    def build(cls, rows: Iterable[List[str]], kanji: List[str]):
+        """
+        rows like the lines of common_words.csv, whose first column is not a word.
+        Only characters in kanji (e.g. the graph nodes) are indexed, kana are skipped.
+        """
+        kanji_index = {character: i for i, character in enumerate(kanji)}
+        words = {}
+        word_kanji = []
+        for row in rows:
+            for word in row[1:]:
+                if word and word not in words:
+                    words[word] = len(words)
+                    word_kanji.append(list(dict.fromkeys(kanji_index[c] for c in word if c in kanji_index)))
+
+        counts = np.asarray([len(indices) for indices in word_kanji], dtype=np.int64)
+        word_indptr = np.zeros(len(words) + 1, dtype=np.int64)
+        word_indptr[1:] = np.cumsum(counts)
+        word_kanji = np.fromiter((i for indices in word_kanji for i in indices), dtype=np.int32,
+                                 count=int(word_indptr[-1]))
+        # invert: words of every kanji, in word order
+        word_of_entry = np.repeat(np.arange(len(words), dtype=np.int32), counts)
+        order = np.argsort(word_kanji, kind='stable')
+        kanji_indptr = np.zeros(len(kanji) + 1, dtype=np.int64)
+        kanji_indptr[1:] = np.cumsum(np.bincount(word_kanji, minlength=len(kanji)))
+        return cls(kanji, words, word_indptr, word_kanji, kanji_indptr, word_of_entry[order])
+
+    @classmethod
+    def from_csv(cls, kanji: List[str], path=WORDS_CSV_PATH):
+        with open(path, 'r', encoding='utf-8', newline='') as f:
+            return cls.build(csv.reader(f), kanji)
+
+    def save(self, path):
+        np.savez(path, kanji=np.asarray(self.kanji), words=np.asarray(self.words),
+                 word_indptr=self.word_indptr, word_kanji=self.word_kanji,
+                 kanji_indptr=self.kanji_indptr, kanji_words=self.kanji_words)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(Path(path)) as data:
+            return cls(data['kanji'].tolist(), data['words'].tolist(), data['word_indptr'], data['word_kanji'],
+                       data['kanji_indptr'], data['kanji_words'])
+
+    def words_with(self, kanji: str) -> List[str]:
+        i = self.kanji_index.get(kanji)
+        if i is None:
+            return []
+        return [self.words[j] for j in self.kanji_words[self.kanji_indptr[i]:self.kanji_indptr[i + 1]].tolist()]
+
+    def kanji_in(self, word: str) -> List[str]:
+        i = self.word_index.get(word)
+        if i is None:
+            return []
+        return [self.kanji[j] for j in self.word_kanji[self.word_indptr[i]:self.word_indptr[i + 1]].tolist()]
+
+
+def load_word_index(graph_path) -> WordIndex:
+    """
+    The word index stored in the snapshot directory of a graph (GEXF, snapshot or .npz path),
+    empty if the graph was built without common_words.csv
+    """
+    path = snapshot_path(graph_path) / WORD_INDEX_FILENAME
+    if not path.exists():
+        return WordIndex.build([], [])
+    return WordIndex.load(path)
@@ -0,0 +1,192 @@
+# response cache and offline backend for the chat completion requests of the worksheet creator
+import asyncio
+import hashlib
+import json
+import re
+import sqlite3
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Optional
+
+
+class ResponseCache:
+    """
+    Content-addressed on-disk cache of chat completions in SQLite, keyed on model, prompt, max_tokens and
+    temperature. When the stored responses exceed max_bytes, the least recently used ones are evicted.
+    """
+
+    def __init__(self, path, max_bytes=50 * 2 ** 20):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # requests can come from worker threads
+        self.connection = sqlite3.connect(self.path, check_same_thread=False)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS responses ('
+                                'key TEXT PRIMARY KEY, model TEXT, response TEXT, size INTEGER, last_used REAL)')
+        self.connection.commit()
+
+    @staticmethod
+    def make_key(model: str, prompt: str, max_tokens: int, temperature: float) -> str:
+        payload = json.dumps([model, prompt, max_tokens, temperature], ensure_ascii=False)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        row = self.connection.execute('SELECT response FROM responses WHERE key = ?', (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.connection.execute('UPDATE responses SET last_used = ? WHERE key = ?', (time.time(), key))
+        self.connection.commit()
+        return row[0]
+
+    def put(self, key: str, model: str, response: Optional[str]):
+        # a missing response would read back like a cache miss, or fail later as a table
+        if response is None:
+            return
+        size = len(response.encode('utf-8'))
+        self.connection.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)',
+                                (key, model, response, size, time.time()))
+        self.evict()
+        self.connection.commit()
+
+    def evict(self):
+        total = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM responses').fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        evicted = []
+        for key, size in self.connection.execute('SELECT key, size FROM responses ORDER BY last_used, rowid'):
+            if total <= self.max_bytes:
+                break
+            evicted.append((key,))
+            total -= size
+        self.connection.executemany('DELETE FROM responses WHERE key = ?', evicted)
+
+    def stats(self) -> dict:
+        entries, size = self.connection.execute('SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses').fetchone()
+        return {'hits': self.hits, 'misses': self.misses, 'entries': entries, 'bytes': size}
+
+    def close(self):
+        self.connection.close()
+
+
+def stub_table(prompt: str, max_rows=None) -> str:
+    """
+    Markdown table with the columns of the example table in the prompt and one row per line of the
+    word list enclosed in ''', optionally truncated like a response that ran out of tokens
+    """
+    table = [line for line in prompt.split('\n') if line.startswith('|')] or ['| 日本語 |']
+    header = table[0]
+    # the example header can be shorter than the separator row
+    columns = max(line.count('|') for line in table) - 1
+    match = re.search(r"'''(.*?)'''", prompt, re.DOTALL)
+    words = [line.strip() for line in (match.group(1) if match else '').split('\n') if line.strip()]
+    rows = [header, '|' + '---|' * columns]
+    rows += ['| ' + ' | '.join([word] + ['-'] * (columns - 1)) + ' |' for word in words[:max_rows]]
+    return '\n'.join(rows)
+
+
+def _completion(content: str):
+    message = SimpleNamespace(content=content)
+    return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class StubClient:
+    """
+    Stand-in for the OpenAI client that answers locally with stub_table, for running the worksheet creator offline
+    """
+
+    def __init__(self):
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+        self.requests = 0
+
+    def create(self, model, messages, max_tokens, temperature):
+        self.requests += 1
+        return _completion(stub_table(messages[-1]['content']))
+
+
+class AsyncStubClient(StubClient):
+    """
+    Stand-in for the AsyncOpenAI client, with an optional simulated latency per request
+    """
+
+    def __init__(self, latency=0.0):
+        super().__init__()
+        self.latency = latency
+
+    async def create(self, model, messages, max_tokens, temperature):
+        self.requests += 1
+        await asyncio.sleep(self.latency)
+        return _completion(stub_table(messages[-1]['content']))
+
+
+class FakeOpenAIServer:
+    """
+    Local HTTP server that implements the chat completions endpoint of the OpenAI API with stub_table responses.
+    Point the client at it with llm.base_url=http://127.0.0.1:<port>/v1.
+    Latency grows with the number of rows, and responses are cut off after max_tokens // tokens_per_row rows,
+    like a real model running into max_tokens. Every failure_rate-th request fails with status 429.
+    """
+
+    def __init__(self, latency=0.2, latency_per_row=0.02, tokens_per_row=25, failure_rate=0, port=0):
+        self.latency = latency
+        self.latency_per_row = latency_per_row
+        self.tokens_per_row = tokens_per_row
+        self.failure_rate = failure_rate
+        self.requests = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f'http://127.0.0.1:{self.server.server_address[1]}/v1'
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+                with fake.lock:
+                    fake.requests += 1
+                    fail = fake.failure_rate and fake.requests % fake.failure_rate == 0
+                if fail:
+                    self._send(429, {'error': {'message': 'rate limited', 'type': 'rate_limit_error'}})
+                    return
+                max_rows = max(1, body.get('max_tokens', 300) // fake.tokens_per_row)
+                content = stub_table(body['messages'][-1]['content'], max_rows)
+                time.sleep(fake.latency + fake.latency_per_row * (content.count('\n') - 1))
+                self._send(200, {
+                    'id': f'chatcmpl-{fake.requests}', 'object': 'chat.completion', 'created': int(time.time()),
+                    'model': body['model'],
+                    'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content},
+                                 'finish_reason': 'stop'}],
+                    'usage': {'prompt_tokens': 0, 'completion_tokens': 0, 'total_tokens': 0},
+                })
+
+            def _send(self, status, payload):
+                data = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
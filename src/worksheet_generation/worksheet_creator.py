@@ -1,25 +1,107 @@
+import asyncio
+import glob
+import hashlib
 import json
 import os
 import logging
+import random
+import re
+import shutil
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import cached_property
 from pathlib import Path
-from typing import List
+from typing import TYPE_CHECKING, Dict, Iterable, Iterator, List
 import subprocess
 
-import hydra
-from openai import OpenAI
-from sudachipy import Dictionary, SplitMode
-from omegaconf import DictConfig
+from src.tracing import tracer
 
-from src.main import KanjiGraph
+if TYPE_CHECKING:
+    from omegaconf import DictConfig
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 PROJECT_DIR = Path(__file__).resolve().parent
 OUTPUT_DIR = PROJECT_DIR / 'out'
-os.environ['OPENAI_API_KEY'] = (PROJECT_DIR / 'openai.txt').read_text().strip()
+# relative paths are resolved against the launch directory, hydra changes the working directory before main() runs
+LAUNCH_DIR = Path.cwd()
+GRAPH_PATH = LAUNCH_DIR / 'data' / 'kanji_digraph.gexf'
+# pandoc runs in this directory, next to the LaTeX template and class file
+TEMPLATE_DIR = LAUNCH_DIR / 'out'
+TEMPLATE_PATH = TEMPLATE_DIR / 'japanese-template.tex'
+# hashes of markdown and template of the last successful compilation of every worksheet
+COMPILE_MANIFEST = OUTPUT_DIR / 'compiled.json'
+_compile_manifest_lock = threading.Lock()
+# characters per tokenizer call, sudachi rejects inputs above ~49k bytes
+CHUNK_SIZE = 4000
+MODEL = "gpt-4-1106-preview"
+MAX_TOKENS = 300
+# estimated completion tokens per table row, used to split the kanji lists into requests that fit MAX_TOKENS
+EXPLANATION_ROW_TOKENS = 40
+VOCAB_ROW_TOKENS = 25
 
-graph = KanjiGraph('data/kanji_digraph.gexf')
+
+class WorksheetContext:
+    """
+    Graph, tokenizer, LLM client and response cache, created on first use so that importing this module, --help and
+    dry runs do not pay for loading the graph, the Sudachi dictionary or the openai package.
+    """
+
+    def __init__(self):
+        self.config = {}
+
+    def configure(self, config):
+        self.config = config
+
+    def llm_setting(self, name, default):
+        return (self.config.get('llm') or {}).get(name, default)
+
+    @cached_property
+    def graph(self):
+        with tracer.span('graph.load'):
+            from src.main import KanjiGraph
+            return KanjiGraph(GRAPH_PATH)
+
+    @cached_property
+    def tokenizer(self):
+        with tracer.span('tokenizer.load'):
+            from sudachipy import Dictionary
+            return Dictionary().create()
+
+    @cached_property
+    def client(self):
+        if self.llm_setting('backend', 'openai') == 'stub':
+            from src.worksheet_generation.llm import StubClient
+            return StubClient()
+        from openai import OpenAI
+        self._set_api_key()
+        return OpenAI(base_url=self.llm_setting('base_url', None))
+
+    @cached_property
+    def async_client(self):
+        if self.llm_setting('backend', 'openai') == 'stub':
+            from src.worksheet_generation.llm import AsyncStubClient
+            return AsyncStubClient()
+        from openai import AsyncOpenAI
+        self._set_api_key()
+        # retries are handled by request_gpt_async
+        return AsyncOpenAI(base_url=self.llm_setting('base_url', None), max_retries=0)
+
+    @staticmethod
+    def _set_api_key():
+        if 'OPENAI_API_KEY' not in os.environ:
+            os.environ['OPENAI_API_KEY'] = (PROJECT_DIR / 'openai.txt').read_text().strip()
+
+    @cached_property
+    def response_cache(self):
+        from src.worksheet_generation.llm import ResponseCache
+        return ResponseCache(LAUNCH_DIR / self.llm_setting('cache', 'data/llm_cache.sqlite'),
+                             max_bytes=self.llm_setting('cache_max_mb', 50) * 2 ** 20)
+
+
+context = WorksheetContext()
 
 
 def get_kanji_data(kanjis: List[str] = None):
@@ -27,8 +109,9 @@ def get_kanji_data(kanjis: List[str] = None):
     Make a list of all kanji in the graph, their components and similar kanji that are not in a lower (more difficult) level
     Write the list to a json file, e.g.: 伺,[亻,司],[飼,詞]
     """
+    graph = context.graph
     if not kanjis:
-        kanjis = list(graph.G.nodes)
+        kanjis = list(graph)
     kanji_list = []
     for kanji in kanjis:
         level = graph.get_level(kanji)
@@ -49,20 +132,149 @@ def get_kanji_data(kanjis: List[str] = None):
             f.write(csv_line + '\n')
 
 
-def request_gpt(user_message: str, model: str, tokens: int) -> json:
-    client = OpenAI()
-    return client.chat.completions.create(
-        model=model,
-        messages=[
-            {"role": "user", "content": user_message},
-        ],
-        max_tokens=tokens,
-        temperature=0.1
-    )
+def request_gpt(user_message: str, model: str, tokens: int, temperature=0.1) -> str:
+    """
+    Content of the chat completion, answered from the response cache if the same request was made before
+    """
+    cache = context.response_cache
+    key = cache.make_key(model, user_message, tokens, temperature)
+    response = cache.get(key)
+    if response is None:
+        with tracer.span('llm.request'):
+            completion = context.client.chat.completions.create(
+                model=model,
+                messages=[
+                    {"role": "user", "content": user_message},
+                ],
+                max_tokens=tokens,
+                temperature=temperature
+            )
+        count_usage(completion)
+        response = completion_content(completion)
+        cache.put(key, model, response)
+    else:
+        tracer.count('llm.cache_hits')
+    return response
 
 
-def request_table_explanations(kanji_list: str):
-    message = f"""以下の日本語の単語を使って、最終的な表を作成してください。各行は表の一行に対応します。
+def completion_content(completion) -> str:
+    """
+    Text of the first choice. Refusals and tool calls have no content, they are neither cached nor used as a table
+    """
+    choice = completion.choices[0]
+    if choice.message.content is None:
+        raise ValueError(f"Chat completion without content (finish_reason: {getattr(choice, 'finish_reason', None)})")
+    return choice.message.content
+
+
+def count_usage(completion):
+    tracer.count('llm.requests')
+    usage = getattr(completion, 'usage', None)
+    if usage is not None:
+        tracer.count('llm.prompt_tokens', usage.prompt_tokens)
+        tracer.count('llm.completion_tokens', usage.completion_tokens)
+
+
+def is_retryable(error: Exception) -> bool:
+    """
+    Connection errors, timeouts, rate limits and server errors of the openai client. Client errors and anything else,
+    like a TypeError from a bug, are raised right away instead of being hidden behind retries.
+    """
+    try:
+        import openai
+    except ImportError:  # the stub backend does not need the openai package
+        return False
+    if isinstance(error, openai.APIStatusError):
+        return error.status_code >= 500 or error.status_code in (408, 409, 429)
+    return isinstance(error, (openai.APIConnectionError, openai.APITimeoutError))
+
+
+async def request_gpt_async(user_message: str, model: str, tokens: int, semaphore: asyncio.Semaphore,
+                            temperature=0.1) -> str:
+    """
+    Async version of request_gpt. Retries failed requests with exponential backoff,
+    except for client errors like invalid requests or authentication failures.
+    """
+    cache = context.response_cache
+    key = cache.make_key(model, user_message, tokens, temperature)
+    response = cache.get(key)
+    if response is not None:
+        tracer.count('llm.cache_hits')
+        return response
+    retries = context.llm_setting('retries', 3)
+    backoff = context.llm_setting('backoff', 1.0)
+    async with semaphore:
+        for attempt in range(retries + 1):
+            try:
+                with tracer.span('llm.request'):
+                    completion = await context.async_client.chat.completions.create(
+                        model=model,
+                        messages=[
+                            {"role": "user", "content": user_message},
+                        ],
+                        max_tokens=tokens,
+                        temperature=temperature
+                    )
+                break
+            except Exception as e:
+                if attempt == retries or not is_retryable(e):
+                    raise
+                tracer.count('llm.retries')
+                delay = backoff * 2 ** attempt * (1 + random.random())
+                logger.warning(f"Request failed ({e}), retrying in {delay:.1f}s")
+                await asyncio.sleep(delay)
+    count_usage(completion)
+    response = completion_content(completion)
+    cache.put(key, model, response)
+    return response
+
+
+def split_rows(kanji_list: str, rows_per_batch: int) -> List[str]:
+    rows = [row for row in kanji_list.split('\n') if row.strip()]
+    return ['\n'.join(rows[i:i + rows_per_batch]) + '\n' for i in range(0, len(rows), rows_per_batch)]
+
+
+def merge_tables(responses: List[str]) -> str:
+    """
+    Concatenate the tables of several responses, keeping only the header and separator row of the first one
+    """
+    lines = []
+    for i, response in enumerate(responses):
+        response_lines = response.strip().split('\n')
+        separator = next((j for j, line in enumerate(response_lines) if re.fullmatch(r'\|[-:| ]+\|', line.strip())),
+                         None)
+        if i > 0 and separator is not None:
+            response_lines = response_lines[separator + 1:]
+        lines.extend(response_lines)
+    return '\n'.join(lines)
+
+
+async def request_table_batched(kanji_list: str, make_message, row_tokens: int, semaphore: asyncio.Semaphore) -> str:
+    batches = split_rows(kanji_list, max(1, MAX_TOKENS // row_tokens)) or ['']
+    responses = await asyncio.gather(*(request_gpt_async(make_message(batch), MODEL, MAX_TOKENS, semaphore)
+                                       for batch in batches))
+    return merge_tables(responses)
+
+
+def request_tables(kanji_list_expl: str, kanji_list_vocab: str) -> (str, str):
+    """
+    Request both tables concurrently, in batches of rows that fit into MAX_TOKENS.
+    At most llm.concurrency requests are in flight at the same time. Rows are returned in input order.
+    """
+    async def request_both():
+        semaphore = asyncio.Semaphore(context.llm_setting('concurrency', 4))
+        return await asyncio.gather(
+            request_table_batched(kanji_list_expl, explanations_message, EXPLANATION_ROW_TOKENS, semaphore),
+            request_table_batched(kanji_list_vocab, vocabs_message, VOCAB_ROW_TOKENS, semaphore))
+
+    # the async client is bound to the event loop it was first used in
+    context.__dict__.pop('async_client', None)
+    expl, vocab = asyncio.run(request_both())
+    return expl, vocab
+
+
+def explanations_message(kanji_list: str) -> str:
+    return f"""以下の日本語の単語を使って、最終的な表を作成してください。各行は表の一行に対応します。
 角括弧[]で囲まれた単語や漢字については、最も一般的に使用されている単語のうちの1つを選んでください。新しい単語を作り出さないでください。与えられた漢字を正確に同じようにコピーしてください。これらの単語については、「使い方」列に角括弧に続く単語を入れてください。
 '''{kanji_list}'''
 表には「日本語」、「読み方」、「意味」、「使い方」、「注意」という列があります。最初の列には私が渡した単語や漢字を、二列目にはふりがなの読み方を、三列目にはドイツ語の翻訳を、四列目には角括弧に続く単語を、最後の列にはビックリマーク(!)で示された、似ている漢字を入れてください。[選ばれた指定された単語]が提供された漢字の表記と正確に一致していることを確認してください。
@@ -72,12 +284,10 @@ def request_table_explanations(kanji_list: str):
 |----------|--------------|------------------|-----------|---|
 | 蔵       | くら          | Speicher         | [蔵書](-ぞうしょ)     |
 | 皆       | みな          | Alle             | [皆様](-みなさま)      |"""
-    response = request_gpt(message, "gpt-4-1106-preview", 300)
-    return response.choices[0].message.content.strip()
 
 
-def request_table_vocabs(kanji_list: str):
-    message = f"""以下の日本語の単語を使って、最終的な表を作成してください。各行は表の一行に対応します。
+def vocabs_message(kanji_list: str) -> str:
+    return f"""以下の日本語の単語を使って、最終的な表を作成してください。各行は表の一行に対応します。
 '''{kanji_list}'''
 表には「日本語」、「読み方」、「意味」という列があります。最初の列には私が渡した単語や漢字を、二列目にはふりがなの読み方を、三列目にはドイツ語の翻訳を入れてください。
 例：
@@ -85,82 +295,269 @@ def request_table_vocabs(kanji_list: str):
 |----------|--------------|------------------|
 | 半蔵     | はんぞう      | Halbversteckt    |
 | 皆       | みな          | Alle             |"""
-    response = request_gpt(message, "gpt-4-1106-preview", 300)
-    return response.choices[0].message.content.strip()
 
 
-def compile_worksheet(input_file: Path):
-    command = f"pandoc -F handle_furigana.py {OUTPUT_DIR / input_file} -o {OUTPUT_DIR / f'{input_file.stem}.pdf'} --template=japanese-template.tex"
-    process = subprocess.Popen(command, shell=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    output, error = process.communicate()
+def request_table_explanations(kanji_list: str):
+    return request_gpt(explanations_message(kanji_list), MODEL, MAX_TOKENS).strip()
+
+
+def request_table_vocabs(kanji_list: str):
+    return request_gpt(vocabs_message(kanji_list), MODEL, MAX_TOKENS).strip()
+
+
+def file_hash(*paths: Path) -> str:
+    digest = hashlib.sha256()
+    for path in paths:
+        digest.update(path.read_bytes())
+    return digest.hexdigest()
 
-    if process.returncode == 0:
-        os.system(f"open {OUTPUT_DIR / input_file.stem}.pdf")
-    else:
-        raise Exception(error.decode('utf-8'))
 
+def run_pandoc(markdown_file: Path) -> Path:
+    pdf_file = markdown_file.with_suffix('.pdf')
+    command = ['pandoc', '-F', 'handle_furigana.py', str(markdown_file), '-o', str(pdf_file),
+               f'--template={TEMPLATE_PATH.name}']
+    with tracer.span('pandoc'):
+        process = subprocess.run(command, cwd=TEMPLATE_DIR, capture_output=True)
+    if process.returncode != 0:
+        raise Exception(process.stderr.decode('utf-8'))
+    return pdf_file
 
-@hydra.main(config_path="../../config", config_name="config")
-def main(config: DictConfig):
+
+def read_compile_manifest() -> dict:
+    return json.loads(COMPILE_MANIFEST.read_text()) if COMPILE_MANIFEST.exists() else {}
+
+
+def open_file(path: Path):
     """
-    Print all kanji in the graph that are in a certain level or lower, marked with * for ChatGPT to search for words.
-    Also print kunyomi if available.
+    Open a file in the default viewer with open (macOS) or xdg-open (Linux), skipped if neither is available
+    """
+    opener = shutil.which('open') or shutil.which('xdg-open')
+    if opener is None:
+        logger.info(f"No viewer available, PDF written to {path}")
+        return
+    subprocess.run([opener, str(path)])
 
-    Example usage:
-    python3 worksheet_creator.py -i kanji_list.csv -l 10
+
+def compile_worksheet(input_file: Path, open_pdf=True) -> bool:
+    """
+    Compile a markdown file in OUTPUT_DIR to PDF, unless markdown and template are unchanged since the last
+    compilation. Returns whether pandoc was run.
+    """
+    markdown_file = OUTPUT_DIR / input_file
+    pdf_file = markdown_file.with_suffix('.pdf')
+    source_hash = file_hash(markdown_file, TEMPLATE_PATH)
+    with _compile_manifest_lock:
+        manifest = read_compile_manifest()
+    compiled = not (pdf_file.exists() and manifest.get(markdown_file.name) == source_hash)
+    if compiled:
+        run_pandoc(markdown_file)
+        with _compile_manifest_lock:
+            # re-read, other compilations may have finished in the meantime
+            manifest = read_compile_manifest()
+            manifest[markdown_file.name] = source_hash
+            # replace instead of rewriting in place, so that the file is never half written
+            temp_file = COMPILE_MANIFEST.with_suffix('.tmp')
+            temp_file.write_text(json.dumps(manifest, indent=2))
+            os.replace(temp_file, COMPILE_MANIFEST)
+    if open_pdf:
+        open_file(pdf_file)
+    return compiled
+
+
+def iter_text_chunks(lines: Iterable[str], chunk_size=CHUNK_SIZE) -> Iterator[str]:
+    """
+    Group lines into chunks of about chunk_size characters, splitting lines that are longer than that
     """
-    input_file = config.input_file
+    chunk = []
+    size = 0
+    for line in lines:
+        for start in range(0, len(line), chunk_size):
+            chunk.append(line[start:start + chunk_size])
+            size += len(chunk[-1])
+            if size >= chunk_size:
+                yield ''.join(chunk)
+                chunk = []
+                size = 0
+    if chunk:
+        yield ''.join(chunk)
+
+
+def iter_morphemes(chunks: Iterable[str], tokenizer) -> Iterator:
+    from sudachipy import SplitMode
+    for chunk in chunks:
+        with tracer.span('tokenize'):
+            morphemes = tokenizer.tokenize(chunk, SplitMode.A)
+        tracer.count('tokenize.characters', len(chunk))
+        tracer.count('tokenize.morphemes', len(morphemes))
+        yield from morphemes
+
+
+def kun_words(kanji: str, okurigana: Iterable[str]) -> str:
+    """
+    Kanji with the okurigana of every kun reading, e.g. [持つ] for も（つ）
+    """
+    words = []
+    for ending in okurigana:
+        if not ending:  # kunyomi without accompanying hiragana
+            words.append(kanji)
+            break
+        words.append(kanji + ending)
+    return '[' + ' '.join(words) + ']'
+
+
+def prepare_kanji_lists(morphemes: Iterable, graph, level: int) -> (str, str):
+    """
+    Single pass over the morphemes of the text. Every kanji up to the given level is listed once, together with
+    the word it first appears in. Kanji that are part of an already listed word are skipped.
+    Returns the kanji list with explanations and the vocab list.
+    """
+    kanji_list_expl = []
+    kanji_list_vocab = []
+    listed = set()  # characters of all listed words
+    for morpheme in morphemes:
+        surface = morpheme.surface()
+        for kanji in surface:
+            if kanji in listed or not 0 <= graph.get_level(kanji) <= level:
+                continue
+            # the current morpheme is the first one containing the kanji
+            kanji_list_vocab.append(f'{surface}\n')
+            listed.update(surface)
+            with tracer.span('lookup'):
+                okurigana = graph.get_okurigana(kanji)
+                if okurigana:
+                    kanji_list_expl.append(kun_words(kanji, okurigana))
+                kanji_list_expl.append(f' {graph.get_common_word(kanji)}')
+                similar_kanji = graph.get_similar_kanji(kanji, level_limit=level)
+                kanji_list_expl.append(f'{" !".join(similar_kanji)}\n')
+    return ''.join(kanji_list_expl), ''.join(kanji_list_vocab)
+
+
+def is_batch(input_path: str) -> bool:
+    return (LAUNCH_DIR / input_path).is_dir() or glob.has_magic(input_path)
+
 
+def resolve_input_files(input_path: str) -> List[Path]:
+    """
+    A single text file, all .txt files in a directory, or the files matching a glob pattern
+    """
+    path = LAUNCH_DIR / input_path
+    if path.is_dir():
+        return sorted(path.glob('*.txt'))
+    if glob.has_magic(input_path):
+        return sorted(Path(match) for match in glob.glob(str(path), recursive=True))
+    return [path]
+
+
+def create_worksheet(input_file: Path, level: int, timings: dict) -> List[Path]:
+    """
+    Write the markdown files with explanations and vocabs for a text, returns their names in OUTPUT_DIR
+    """
+    start = time.perf_counter()
+    # tokenize in chunks, so that memory stays flat for long texts
     with open(input_file, 'r', encoding='utf-8') as f:
-        text = f.read()
-    tokenizer = Dictionary().create()
-    morphemes = tokenizer.tokenize(text, SplitMode.A)
-    kanji_list_expl = ""
-    kanji_list_vocab = ""
-    for kanji in text:
-        if 0 <= graph.get_level(kanji) <= int(config.level) and kanji not in kanji_list_vocab:
-            # print word containing kanji
-            for morpheme in morphemes:
-                if kanji in morpheme.surface():
-                    kanji_list_vocab += f'{morpheme.surface()}\n'
-                    break
-            _, reading_kun = graph.get_readings(kanji)
-            # extract characters enclosed in brackets from first reading_kun
-            if reading_kun:
-                kanji_list_expl += "["
-                try:
-                    for i in range(len(reading_kun)):
-                        kanji_list_expl += kanji + reading_kun[i].split('（')[1].split('）')[0] + (
-                            ' ' if i < len(reading_kun) - 1 else ']')
-                except IndexError:  # kunyomi without accompanying hiragana
-                    # print(kanji)
-                    kanji_list_expl += kanji + ']'
-            common_word = graph.G.nodes[kanji]['common_word'] if 'common_word' in graph.G.nodes[kanji] else ''
-            kanji_list_expl += f' {common_word}'
-            similar_kanji = graph.get_similar_kanji(kanji, level_limit=config.level)
-            kanji_list_expl += f'{" !".join(similar_kanji)}\n'
+        morphemes = iter_morphemes(iter_text_chunks(f), context.tokenizer)
+        graph = context.graph
+        with tracer.span('prepare'):
+            kanji_list_expl, kanji_list_vocab = prepare_kanji_lists(morphemes, graph, level)
+    timings['prepare'] = time.perf_counter() - start
 
     logging.info(f"Kanji list with explanations:\n{kanji_list_expl}")
     logging.info(f"Kanji list with vocabs:\n{kanji_list_vocab}")
     # sys.exit(0) # only print kanji list, since gpt-4 still makes mistakes
-    response = request_table_explanations(kanji_list_expl)
-    logging.info(f"Response:\n{response}")
-    response = [line for line in response.split('\n') if len(line) < 63 and line.count('|') == 6]
+    start = time.perf_counter()
+    with tracer.span('llm'):
+        response_expl, response_vocab = request_tables(kanji_list_expl, kanji_list_vocab)
+    timings['llm'] = time.perf_counter() - start
+    logging.info(f"Response:\n{response_expl}")
+    response = [line for line in response_expl.split('\n') if len(line) < 63 and line.count('|') == 6]
     response = '\n'.join(response)
     # write one version with explanations, one without
     with open(OUTPUT_DIR / f'vocab-{input_file.stem}-explanations.md', 'w', encoding='utf-8') as f:
         f.write(response)
-    compile_worksheet(Path(f'vocab-{input_file.stem}-explanations.md'))
-    response = request_table_vocabs(kanji_list_vocab)
-    logging.info(f"Response:\n{response}")
-    response = [line for line in response.split('\n') if len(line) < 55 and line.count('|') == 4]
+    logging.info(f"Response:\n{response_vocab}")
+    response = [line for line in response_vocab.split('\n') if len(line) < 55 and line.count('|') == 4]
     response = '\n'.join(response)
     with open(OUTPUT_DIR / f'vocab-{input_file.stem}-vocabs.md', 'w', encoding='utf-8') as f:
         f.write(response)
-    compile_worksheet(Path(f'vocab-{input_file.stem}-vocabs.md'))
+    return [Path(f'vocab-{input_file.stem}-explanations.md'), Path(f'vocab-{input_file.stem}-vocabs.md')]
+
+
+def create_worksheets(input_files: List[Path], level: int, workers: int) -> Dict[str, dict]:
+    """
+    Batch mode: create the worksheets for many texts with one graph, tokenizer and LLM client.
+    PDFs are compiled by at most workers pandoc processes while the next texts are prepared.
+    Returns the timings per input file.
+    """
+    report = {}
+    compilations: Dict[str, List[Future]] = {}
+
+    def timed_compile(markdown_file: Path):
+        start = time.perf_counter()
+        compiled = compile_worksheet(markdown_file, open_pdf=False)
+        return markdown_file.name, time.perf_counter() - start, compiled
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for input_file in input_files:
+            timings = report[str(input_file)] = {}
+            start = time.perf_counter()
+            try:
+                markdown_files = create_worksheet(input_file, level, timings)
+            except Exception as e:
+                logger.exception(f"Failed to create worksheet for {input_file}")
+                timings['error'] = str(e)
+                continue
+            finally:
+                timings['create'] = time.perf_counter() - start
+            compilations[str(input_file)] = [executor.submit(timed_compile, markdown_file)
+                                             for markdown_file in markdown_files]
+
+        for input_file, futures in compilations.items():
+            timings = report[input_file]
+            timings['compile'] = {}
+            for future in futures:
+                try:
+                    name, seconds, compiled = future.result()
+                    timings['compile'][name] = {'seconds': seconds, 'skipped': not compiled}
+                except Exception as e:
+                    timings['error'] = str(e)
+    return report
+
+
+def main(config: 'DictConfig'):
+    """
+    Print all kanji in the graph that are in a certain level or lower, marked with * for ChatGPT to search for words.
+    Also print kunyomi if available.
+    If input_file is a directory or a glob pattern, worksheets for all matching texts are created in batch mode
+    and a summary with timings per file is written to OUTPUT_DIR/batch-report.json.
+    With trace.enabled, stage timings, graph and LLM counters are written to OUTPUT_DIR/traces/trace-<time>.json,
+    with trace.profile also a cProfile profile.
+
+    Example usage:
+    python3 worksheet_creator.py -i kanji_list.csv -l 10
+    """
+    context.configure(config)
+    tracer.configure(config.get('trace'))
+    input_files = resolve_input_files(config.input_file)
+    if not is_batch(config.input_file):
+        for markdown_file in create_worksheet(input_files[0], int(config.level), {}):
+            compile_worksheet(markdown_file)
+    else:
+        start = time.perf_counter()
+        report = create_worksheets(input_files, int(config.level), config.get('compile_workers', 4))
+        with open(OUTPUT_DIR / 'batch-report.json', 'w', encoding='utf-8') as f:
+            json.dump({'total_seconds': time.perf_counter() - start, 'files': report}, f, indent=2, ensure_ascii=False)
+        failed = [name for name, timings in report.items() if 'error' in timings]
+        logging.info(f"Created {len(report) - len(failed)} of {len(report)} worksheets, failed: {failed}")
+    logging.info(f"LLM response cache: {context.response_cache.stats()}")
+    if tracer.enabled or tracer.profiler is not None:
+        trace_file = tracer.write(OUTPUT_DIR / 'traces')
+        logging.info(f"Trace written to {trace_file}:\n{tracer.summary()}")
 
 
 if __name__ == '__main__':
+    # hydra is only needed for the command line, keep it out of the import of this module
+    import hydra
+
     if not OUTPUT_DIR.exists():
         OUTPUT_DIR.mkdir()
-    main()
+    hydra.main(config_path="../../config", config_name="config")(main)()